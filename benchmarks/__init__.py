@@ -0,0 +1,2 @@
+# File: benchmarks/__init__.py
+"""Benchmarks offline de los scripts del scheduler (ver benchmarks/run.py)."""
@@ -0,0 +1,104 @@
+# File: benchmarks/fixtures.py
+"""
+Fixtures sintéticas y deterministas (misma semilla = mismos datos) para correr los scripts
+sin red: histórico de yfinance, respuesta de Open-Meteo y CSV de recordatorios.
+"""
+import csv
+import io
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+def symbols(n: int) -> List[str]:
+    return [f"T{i:04d}" for i in range(n)]
+
+def price_history(tickers: List[str], days: int, seed: int = 7) -> pd.DataFrame:
+    """
+    Barras diarias hábiles hasta hoy con el formato de yf.download(group_by="ticker"):
+    columnas MultiIndex (símbolo, campo).
+    """
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    close = 100 * np.cumprod(1 + rng.normal(0.0003, 0.02, (days, len(tickers))), axis=0)
+    spread = np.abs(rng.normal(0, 0.01, (days, len(tickers))))
+    data = {}
+    for j, sym in enumerate(tickers):
+        c = close[:, j]
+        data[(sym, "Open")] = c * (1 - spread[:, j] / 2)
+        data[(sym, "High")] = c * (1 + spread[:, j])
+        data[(sym, "Low")] = c * (1 - spread[:, j])
+        data[(sym, "Close")] = c
+        data[(sym, "Volume")] = rng.integers(1e5, 1e7, days).astype(float)
+    frame = pd.DataFrame(data, index=idx)
+    frame.columns = pd.MultiIndex.from_tuples(frame.columns)
+    return frame
+
+class FakeYFinance:
+    """Sustituto de yfinance con la misma firma de download() que usa investment/price_cache.py."""
+
+    def __init__(self, history: pd.DataFrame):
+        self.history = history
+
+    def download(self, tickers, period=None, start=None, interval="1d", **kwargs) -> pd.DataFrame:
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        known = [t for t in tickers if t in self.history.columns.get_level_values(0)]
+        frame = self.history.loc[:, known]
+        if start:
+            frame = frame[frame.index >= pd.Timestamp(start)]
+        elif period:
+            days = int(str(period).rstrip("d"))
+            if days <= 1:
+                frame = frame.iloc[-1:]
+            else:
+                frame = frame[frame.index >= frame.index[-1] - pd.Timedelta(days=days)]
+        return frame.copy()
+
+def locations(n: int) -> List[Dict]:
+    return [{"name": f"Ubicación {i}", "lat": 32.0 + i * 0.01, "lon": -117.0 - i * 0.01} for i in range(n)]
+
+def open_meteo(n: int, tz: str, variables: List[str], seed: int = 11) -> list:
+    """Respuesta de Open-Meteo para n ubicaciones (lista, como con coordenadas separadas por coma)."""
+    rng = np.random.default_rng(seed)
+    day = datetime.now().strftime("%Y-%m-%d")
+    times = [f"{day}T{h:02d}:00" for h in range(24)]
+    out = []
+    for _ in range(n):
+        base = rng.uniform(5, 25)
+        hourly = {"time": times}
+        for var in variables:
+            hourly[var] = [round(base + 5 * np.sin((h - 14) / 24 * 2 * np.pi) + rng.normal(0, 1), 1)
+                           for h in range(24)]
+        hour = datetime.now().hour
+        out.append({"timezone": tz, "current": {var: hourly[var][hour] for var in variables}, "hourly": hourly})
+    return out
+
+def reminders_csv(rows: int, due_fraction: float = 0.1, seed: int = 5) -> str:
+    """
+    CSV de recordatorios (ACTIVIDAD, FRECUENCIA, UNIDAD, FECHA, HORA) con mezcla de unidades;
+    aproximadamente `due_fraction` de las filas diarias vencen a la hora actual.
+    """
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["ACTIVIDAD", "FRECUENCIA", "UNIDAD", "FECHA", "HORA"])
+    for i in range(rows):
+        unit = ["DAY", "WEEK", "MONTH", "YEAR"][i % 4]
+        if unit == "DAY" and rng.random() < due_fraction:
+            at = now
+        else:
+            at = now.replace(hour=int(rng.integers(0, 24)), minute=int(rng.integers(0, 60)))
+        base = now - timedelta(days=int(rng.integers(0, 400)))
+        if unit == "WEEK":
+            fecha = str(int(rng.integers(1, 8)))
+        elif unit == "MONTH" and i % 8 == 2:
+            fecha = str(int(rng.integers(1, 29)))
+        else:
+            fecha = base.strftime("%d/%m/%Y")
+        w.writerow([f"Actividad {i}", int(rng.integers(1, 4)) if unit != "DAY" else 1, unit, fecha,
+                    f"{at.hour}{at.minute:02d}"])
+    return buf.getvalue()
@@ -0,0 +1,304 @@
+# File: benchmarks/run.py
+"""
+Benchmark offline de cada script del scheduler y de un tick completo de main.scheduler.
+
+Sin red: yfinance se sustituye por datos sintéticos (benchmarks/fixtures.py) y Discord,
+Open-Meteo y Google Sheets por un servidor local (benchmarks/stubs.py). El estado y la caché
+de precios van a un directorio temporal, nunca a data/.
+
+Uso:
+    python -m benchmarks.run                                   # escala por defecto
+    python -m benchmarks.run --tickers 500 --reminders 2000 --locations 20
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 25
+    python -m benchmarks.run --cold                            # sin cachés en cada repetición
+
+Por caso se mide (mediana de --repeat corridas, tras --warmup de calentamiento):
+wall_ms, cpu_ms (todo el proceso, incluye el hilo de envío) y, en una corrida aparte con
+tracemalloc, peak_kb (pico de memoria Python) y alloc_kb (memoria que quedó asignada).
+Con --baseline, sale con código 1 si wall_ms, cpu_ms o peak_kb empeoran más de --tolerance %.
+
+scheduler_tick corre main.scheduler con el reloj congelado y todos los scripts vencidos: un
+tick completo (heap, política de solapamiento, timeouts, hilos y procesos según el "mode" de
+cada script) hasta que terminan todas las corridas. Los procesos de trabajo aplican los mismos
+parches al arrancar (benchmarks/worker.py) y se conservan entre repeticiones, como en el
+scheduler real; el de la primera corrida (arranque por spawn) cae en el calentamiento.
+cpu_ms y peak_kb son solo del proceso del scheduler, no de los procesos de trabajo.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks import fixtures, worker
+from benchmarks.stubs import RemoteStub, StubServer
+
+# ============== CONFIG ==============
+CASES = ["investment.stocks", "investment.sp500", "enviroment.weather", "maintenance.preventive", "scheduler_tick"]
+COMPARED = ["wall_ms", "cpu_ms", "peak_kb"]
+RESET_NS = ["stocks.cooldown", "reminders.sent", "scheduler"]   # envíos/cooldowns: cada repetición alerta igual
+# ===================================
+
+class Harness:
+    """
+    Prepara módulos, fixtures y stubs; expone una función por caso.
+    Con stub_url (en un proceso de trabajo del scheduler) solo aplica los parches, apuntando al
+    StubServer del proceso principal.
+    """
+
+    def __init__(self, args, workdir: Path, stub_url: Optional[str] = None):
+        self.args = args
+        self.workdir = workdir
+
+        from utilities import state_store
+        from investment import price_cache
+        state_store.DATA_DIR, state_store.DB_PATH = workdir, workdir / "state.sqlite3"
+        price_cache.DATA_DIR, price_cache.DB_PATH = workdir, workdir / "prices.sqlite3"
+        self.state_store, self.price_cache = state_store, price_cache
+
+        from enviroment import weather
+        from investment import sp500, stocks
+        from maintenance import preventive
+        from utilities import sender
+        self.weather, self.sp500, self.stocks = weather, sp500, stocks
+        self.preventive, self.sender = preventive, sender
+
+        tickers = fixtures.symbols(args.tickers)
+        history = fixtures.price_history(tickers + list(sp500.INDEX_TICKERS), args.days)
+        if stub_url is None:
+            self.stub = StubServer(
+                fixtures.open_meteo(args.locations, weather.TZ, weather.HOURLY_VARS),
+                fixtures.reminders_csv(args.reminders),
+            ).start()
+        else:
+            self.stub = RemoteStub(stub_url)
+        self._patch(fixtures.FakeYFinance(history), tickers)
+        if stub_url is None:
+            import main
+            self.main = main
+            self._patch_scheduler()
+
+    def _patch(self, fake_yf, tickers: List[str]) -> None:
+        stocks, sp500, weather, preventive = self.stocks, self.sp500, self.weather, self.preventive
+        self.price_cache._yf = lambda: fake_yf
+
+        stocks.TICKERS = tickers
+        investing = self.stub.webhook("investing")
+        stocks.DISCORD_WEBHOOK_URL_INVESTING = sp500.DISCORD_WEBHOOK_URL_INVESTING = investing
+        digest = self.sender.DIGEST_WEBHOOKS.get(self.sender.DISCORD_WEBHOOK_URL_INVESTING)
+        if digest:
+            self.sender.DIGEST_WEBHOOKS[investing] = dict(digest)
+        weather.DISCORD_WEBHOOK_URL_WEATHER = self.stub.webhook("weather")
+        preventive.DISCORD_WEBHOOK_URL_REMINDER = self.stub.webhook("reminder")
+
+        weather.OPEN_METEO_URL = f"{self.stub.base_url}/forecast"
+        weather.LOCATIONS = fixtures.locations(self.args.locations)
+        weather._within_window = lambda *a, **k: True    # siempre dentro de la ventana de aviso
+        preventive.SHEET_CSV_URL = f"{self.stub.base_url}/sheet.csv"
+
+        # estado heredado: nunca tocar los JSON reales
+        for mod, attrs in ((stocks, ("STATE_FILE", "EMA_STATE_FILE")), (sp500, ("ATH_STATE_FILE",)),
+                           (preventive, ("STATE_FILE",))):
+            for attr in attrs:
+                setattr(mod, attr, self.workdir / f"{mod.__name__}.{attr}.json")
+
+    def _patch_scheduler(self) -> None:
+        """Scheduler del tick: todo vence en el instante congelado; los procesos de trabajo se parchean igual."""
+        main = self.main
+        for config in main.SCRIPTS.values():
+            if config.get("trigger") in ("market", "at"):
+                # con el reloj congelado la bolsa puede estar cerrada o no ser la hora: intervalo fijo
+                config["trigger"] = "interval"
+                config.setdefault("interval", 86400)
+        main.STARTUP_STAGGER_S = main.STARTUP_JITTER_S = 0
+        main._prewarm = lambda: None     # los procesos ya quedan arriba tras el calentamiento
+        os.environ[worker.ENV] = json.dumps({"args": vars(self.args), "workdir": str(self.workdir),
+                                             "stub_url": self.stub.base_url})
+        main.job_runner.init_worker = worker.init_worker
+
+    def close(self) -> None:
+        self.stub.stop()
+        main = getattr(self, "main", None)
+        if main is not None:
+            for pool, _ in list(main._process_pools.values()):
+                pool.shutdown(wait=True)
+            main._process_pools.clear()
+        os.environ.pop(worker.ENV, None)
+
+    def reset(self) -> None:
+        """Entre repeticiones: olvida envíos y cooldowns; con --cold también las cachés."""
+        for ns in RESET_NS:
+            keys = list(self.state_store.get_all(ns))
+            if keys:
+                self.state_store.delete(ns, keys)
+        self.preventive._rows_ref = self.preventive._rows_sig = None
+        self.main.cooldowns.clear()
+        self.main.next_run.clear()
+        self.main.queue.clear()
+        if self.args.cold:
+            con = self.state_store._conn()
+            with con:
+                con.execute("DELETE FROM kv")
+            con = self.price_cache._connect()
+            with con:
+                con.execute("DELETE FROM bars")
+                con.execute("DELETE FROM series")
+            con.close()
+            self.preventive._sheet = None
+
+    def case(self, name: str) -> Callable[[], None]:
+        if name == "scheduler_tick":
+            return self._tick
+        module = {"investment.stocks": self.stocks, "investment.sp500": self.sp500,
+                  "enviroment.weather": self.weather, "maintenance.preventive": self.preventive}[name]
+
+        def run():
+            module.main()
+            self.sender.flush()
+        return run
+
+    def _tick(self) -> None:
+        """Un tick de main.scheduler con el reloj congelado: todos los scripts vencen y se espera a que terminen."""
+        main = self.main
+        frozen = datetime.now()
+
+        class Clock(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return frozen if tz is None else frozen.astimezone(tz)
+
+        async def tick():
+            loop = asyncio.create_task(main.scheduler())
+            try:
+                # el loop lanza todo lo vencido sin ceder; luego cada next_run queda después de `frozen`
+                while len(main.next_run) < len(main.SCRIPTS) or any(t <= frozen for t in main.next_run.values()):
+                    if loop.done():
+                        loop.result()
+                    await asyncio.sleep(0)
+                await asyncio.gather(*list(main.running.values()), return_exceptions=True)
+            finally:
+                # en 3.11 wait_for se traga la cancelación si el evento ya estaba puesto: insistir
+                while not loop.done():
+                    loop.cancel()
+                    await asyncio.sleep(0)
+
+        real, main.datetime = main.datetime, Clock
+        try:
+            asyncio.run(tick())
+        finally:
+            main.datetime = real
+        main._state_executor.submit(lambda: None).result()   # escrituras de estado del tick
+        self.sender.flush()
+
+def measure(run: Callable[[], None], reset: Callable[[], None], repeat: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        reset()
+        run()
+    walls, cpus = [], []
+    for _ in range(repeat):
+        reset()
+        gc.collect()
+        w0, c0 = time.perf_counter(), time.process_time()
+        run()
+        walls.append((time.perf_counter() - w0) * 1000)
+        cpus.append((time.process_time() - c0) * 1000)
+
+    reset()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "wall_ms": round(statistics.median(walls), 2),
+        "cpu_ms": round(statistics.median(cpus), 2),
+        "peak_kb": round(peak / 1024, 1),
+        "alloc_kb": round(current / 1024, 1),
+    }
+
+def compare(results: Dict[str, dict], baseline: dict, tolerance: float) -> List[str]:
+    """Imprime la comparación y regresa la lista de regresiones."""
+    regressions = []
+    print(f"\nComparación contra baseline (tolerancia {tolerance:.0f}%):")
+    for case, res in results.items():
+        base = baseline.get("results", {}).get(case)
+        if not base:
+            print(f"  {case:24s} sin baseline")
+            continue
+        parts = []
+        for metric in COMPARED:
+            old, new = base.get(metric), res[metric]
+            if not old:
+                continue
+            delta = (new - old) / old * 100
+            flag = ""
+            if delta > tolerance:
+                flag = " ❌"
+                regressions.append(f"{case} {metric} {old} -> {new} (+{delta:.0f}%)")
+            parts.append(f"{metric} {old}->{new} ({delta:+.0f}%){flag}")
+        print(f"  {case:24s} " + "  ".join(parts))
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n\n")[0])
+    p.add_argument("--tickers", type=int, default=50, help="símbolos en investment.stocks")
+    p.add_argument("--reminders", type=int, default=200, help="filas en la hoja de recordatorios")
+    p.add_argument("--locations", type=int, default=5, help="ubicaciones de clima")
+    p.add_argument("--days", type=int, default=800, help="barras diarias de histórico sintético")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--warmup", type=int, default=1)
+    p.add_argument("--cold", action="store_true", help="vaciar cachés (precios, pronóstico, hoja) en cada repetición")
+    p.add_argument("--cases", help=f"subconjunto separado por comas de: {', '.join(CASES)}")
+    p.add_argument("--baseline", help="JSON con resultados previos para comparar")
+    p.add_argument("--tolerance", type=float, default=25.0, help="%% de empeoramiento permitido vs baseline")
+    p.add_argument("--save-baseline", help="guardar los resultados en este JSON")
+    args = p.parse_args(argv)
+
+    cases = [c.strip() for c in args.cases.split(",")] if args.cases else CASES
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        p.error(f"casos desconocidos: {', '.join(unknown)}")
+
+    params = {k: getattr(args, k) for k in ("tickers", "reminders", "locations", "days", "cold")}
+    with tempfile.TemporaryDirectory(prefix="smarthome-bench-") as tmp:
+        harness = Harness(args, Path(tmp))
+        try:
+            results = {}
+            print(f"Parámetros: {params}")
+            print(f"{'caso':24s} {'wall_ms':>10s} {'cpu_ms':>10s} {'peak_kb':>10s} {'alloc_kb':>10s}")
+            for case in cases:
+                res = measure(harness.case(case), harness.reset, args.repeat, args.warmup)
+                results[case] = res
+                print(f"{case:24s} {res['wall_ms']:>10} {res['cpu_ms']:>10} {res['peak_kb']:>10} {res['alloc_kb']:>10}")
+            print(f"Mensajes recibidos por el stub de Discord: {dict(harness.stub.posts)}")
+        finally:
+            harness.close()
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(
+            json.dumps({"params": params, "results": results}, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Baseline guardado en {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if baseline.get("params") != params:
+            print(f"⚠️  Parámetros distintos a los del baseline: {baseline.get('params')}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegresiones:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
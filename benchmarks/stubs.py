@@ -0,0 +1,95 @@
+# File: benchmarks/stubs.py
+"""
+Servidor HTTP local que sustituye a Discord, Open-Meteo y Google Sheets durante los benchmarks.
+
+- POST /webhooks/<canal>  -> 204 (cuenta los mensajes recibidos por canal)
+- GET  /forecast          -> JSON de Open-Meteo de la fixture
+- GET  /sheet.csv         -> CSV de recordatorios con ETag (responde 304 si no cambió)
+"""
+import hashlib
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+class StubServer:
+    def __init__(self, forecast: list, sheet_csv: str):
+        self.forecast = json.dumps(forecast).encode()
+        self.sheet = sheet_csv.encode()
+        self.etag = f'"{hashlib.md5(self.sheet).hexdigest()[:16]}"'
+        self.posts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def webhook(self, channel: str) -> str:
+        return f"{self.base_url}/webhooks/{channel}"
+
+    def start(self) -> "StubServer":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive, como los servicios reales
+
+            def _reply(self, code: int, body: bytes = b"", ctype: str = "application/json", headers=None):
+                self.send_response(code)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                if code != 304:
+                    self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                if self.path.startswith("/webhooks/"):
+                    with stub._lock:
+                        stub.posts[self.path.rsplit("/", 1)[-1]] += 1
+                    self._reply(204)
+                else:
+                    self._reply(404)
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/forecast":
+                    self._reply(200, stub.forecast)
+                elif path == "/sheet.csv":
+                    if self.headers.get("If-None-Match") == stub.etag:
+                        self._reply(304, headers={"ETag": stub.etag})
+                    else:
+                        self._reply(200, stub.sheet, "text/csv", {"ETag": stub.etag})
+                else:
+                    self._reply(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="bench-stub", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+class RemoteStub:
+    """Direcciones de un StubServer que corre en otro proceso (procesos de trabajo del scheduler)."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def webhook(self, channel: str) -> str:
+        return f"{self.base_url}/webhooks/{channel}"
+
+    def stop(self) -> None:
+        pass
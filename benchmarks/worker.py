@@ -0,0 +1,21 @@
+# File: benchmarks/worker.py
+"""
+Inicializador de los procesos de trabajo del scheduler durante el caso scheduler_tick:
+aplica en el proceso hijo los mismos parches que benchmarks.run.Harness en el principal
+(fixtures, stubs, directorio temporal) y luego el inicializador normal.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+from utilities import job_runner
+
+ENV = "SMARTHOME_BENCH_WORKER"     # JSON con args, workdir y stub_url (lo pone Harness)
+_init_worker = job_runner.init_worker
+
+def init_worker(preload=(), pid=None) -> None:
+    from benchmarks.run import Harness
+    conf = json.loads(os.environ[ENV])
+    Harness(argparse.Namespace(**conf["args"]), Path(conf["workdir"]), stub_url=conf["stub_url"])
+    _init_worker(preload, pid)
@@ -1,6 +1,8 @@
 # temp_now.py
-import requests, sys, logging
+import logging
 from datetime import datetime
+from typing import Dict, List, Optional
+from utilities import http_client, state_store
 from utilities.sender import send_discord_message, DISCORD_WEBHOOK_URL_WEATHER
 
 try:
@@ -13,6 +15,17 @@ LAT = 32.5149                 # Tijuana
 LON = -117.0382
 TZ  = "America/Tijuana"
 
+# Ubicaciones a vigilar; todas se piden en una sola llamada a Open-Meteo.
+# "threshold_c" es opcional (por defecto COLD_THRESHOLD_C).
+LOCATIONS = [
+    {"name": "Tijuana", "lat": LAT, "lon": LON},
+]
+HOURLY_VARS = ["temperature_2m", "apparent_temperature"]   # se piden actuales ("current") y por hora
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+FORECAST_NS = "weather.forecast"   # pronóstico horario del día por ubicación (para la mínima del día)
+FORECAST_TTL_S = 36 * 3600         # la llave incluye la fecha: solo se reutiliza el mismo día
+
 NOTIFY_AT = "05:30"           # Hora local a la que debe avisar (formato 24h HH:MM)
 WINDOW_MIN = 5                # Ventana (±) para tolerar ejecuciones alrededor de la hora (en minutos)
 
@@ -32,23 +45,63 @@ def _within_window(now, hhmm: str, window_min: int) -> bool:
     delta_min = abs((now - target).total_seconds()) / 60.0
     return delta_min <= (window_min / 2.0)
 
-def _fetch_current(lat: float, lon: float, tz: str):
+def _cache_key(loc: Dict, tz: str, day: str) -> str:
+    return f"{day}|{tz}|{','.join(HOURLY_VARS)}|{loc['lat']:.4f},{loc['lon']:.4f}"
 
-    url = "https://api.open-meteo.com/v1/forecast"
+def _fetch_weather(locations: List[Dict], tz: str, hourly: bool = True) -> List[Dict[str, dict]]:
+    """
+    Condiciones actuales (y, con hourly=True, pronóstico horario del día) para todas las
+    ubicaciones en una sola llamada (Open-Meteo acepta coordenadas separadas por coma y
+    responde una lista). Regresa por ubicación {"current": {...}, "hourly": {...}}.
+    """
     params = {
-        "latitude": lat,
-        "longitude": lon,
-        "current": "temperature_2m,apparent_temperature",
+        "latitude": ",".join(str(l["lat"]) for l in locations),
+        "longitude": ",".join(str(l["lon"]) for l in locations),
+        "current": ",".join(HOURLY_VARS),
+        "forecast_days": 1,
         "timezone": tz,
     }
-    r = requests.get(url, params=params, timeout=10)
+    if hourly:
+        params["hourly"] = ",".join(HOURLY_VARS)
+    r = http_client.get(OPEN_METEO_URL, params=params, timeout=10)
     r.raise_for_status()
     data = r.json()
-    cur = data.get("current", {})
-    temp = cur.get("temperature_2m")
-    app  = cur.get("apparent_temperature")
-    ts   = cur.get("time")
-    return float(temp) if temp is not None else None, float(app) if app is not None else None, ts
+    if isinstance(data, dict):      # una sola ubicación -> objeto, no lista
+        data = [data]
+    if len(data) != len(locations):
+        raise ValueError(f"Open-Meteo devolvió {len(data)} ubicaciones, se pidieron {len(locations)}.")
+    return [{"current": d.get("current", {}), "hourly": d.get("hourly", {})} for d in data]
+
+def _weather(now: datetime, locations: Optional[List[Dict]] = None, tz: str = TZ) -> List[Dict[str, dict]]:
+    """
+    Como _fetch_weather, con el pronóstico horario cacheado por ubicación y día en el state store:
+    si todas las ubicaciones ya lo tienen, solo se piden las condiciones actuales.
+    """
+    locations = locations or LOCATIONS
+    day = now.strftime("%Y-%m-%d")
+    keys = [_cache_key(loc, tz, day) for loc in locations]
+    try:
+        cached = [state_store.get(FORECAST_NS, key) for key in keys]
+    except Exception as e:
+        logging.warning(f"No se pudo leer el caché de pronóstico: {e}")
+        cached = [None] * len(keys)
+
+    missing = any(c is None for c in cached)
+    weather = _fetch_weather(locations, tz, hourly=missing)
+    if not missing:
+        for data, hourly in zip(weather, cached):
+            data["hourly"] = hourly
+        return weather
+    try:
+        state_store.put_many(FORECAST_NS, {key: data["hourly"] for key, data in zip(keys, weather)
+                                           if data["hourly"]}, ttl_s=FORECAST_TTL_S)
+    except Exception as e:
+        logging.warning(f"No se pudo guardar el caché de pronóstico: {e}")
+    return weather
+
+def _day_min(hourly: Dict[str, list], var: str) -> Optional[float]:
+    values = [v for v in (hourly.get(var) or []) if v is not None]
+    return float(min(values)) if values else None
 
 def main(threshold_c: float = COLD_THRESHOLD_C) -> bool:
     now = _now_local()
@@ -58,21 +111,31 @@ def main(threshold_c: float = COLD_THRESHOLD_C) -> bool:
         return False
 
     try:
-        temp_c, apparent_c, ts = _fetch_current(LAT, LON, TZ)
-        value = apparent_c if USE_APPARENT else temp_c
+        var = "apparent_temperature" if USE_APPARENT else "temperature_2m"
         metric = "sensación térmica" if USE_APPARENT else "temperatura"
-
-        if value is None:
+        weather = _weather(now)
+
+        cold, missing = [], []
+        for loc, data in zip(LOCATIONS, weather):
+            value = data["current"].get(var)
+            if value is None:
+                # una ubicación sin dato no debe tapar las alertas de las demás
+                logging.warning(f"No se recibió dato de temperatura actual para {loc['name']}; se omite.")
+                missing.append(loc["name"])
+                continue
+            value = float(value)
+            if value < loc.get("threshold_c", threshold_c):
+                cold.append((loc["name"], value, _day_min(data["hourly"], var)))
+        if len(missing) == len(LOCATIONS):
             raise ValueError("No se recibió dato de temperatura actual.")
 
-        if value < threshold_c:
-            message = (
-                f"🌡️ **Alerta de clima** 🌡️\n"
-                f"La {metric} de hoy es **{value:.1f} °C** \n"
-                f"Ubicación: **Tijuana**\n"
-                f"**Tip:** Hoy vale la pena abrigarse. 🧥"
-            )
-            send_discord_message(DISCORD_WEBHOOK_URL_WEATHER, message)
+        if cold:
+            lines = [f"🌡️ **Alerta de clima** 🌡️"]
+            for name, value, low in cold:
+                low_txt = f" (mínima del día {low:.1f} °C)" if low is not None else ""
+                lines.append(f"La {metric} de hoy en **{name}** es **{value:.1f} °C**{low_txt}")
+            lines.append(f"**Tip:** Hoy vale la pena abrigarse. 🧥")
+            send_discord_message(DISCORD_WEBHOOK_URL_WEATHER, "\n".join(lines))
             return True  # -> permite a tu scheduler aplicar cooldown
         else:
             return False
@@ -0,0 +1,221 @@
+# File: investment/backtest.py
+"""
+Replay de las reglas de alerta de investment.stocks e investment.sp500 sobre el histórico
+diario guardado en la caché local (investment/price_cache.py), para calibrar umbrales y
+cooldowns. NUNCA envía nada a Discord: solo lee la caché y reporta.
+
+Uso:
+    python -m investment.backtest                               # EMA200 con la config actual
+    python -m investment.backtest --thresholds 10,15,20,25 --cooldowns 86400,604800
+    python -m investment.backtest --rule rsi_below --thresholds 20,25,30
+    python -m investment.backtest --rule sp500 --thresholds 2,3,5,10 --detail
+    python -m investment.backtest --years 10 --refresh          # baja antes el histórico que falte
+
+Cada combinación umbral × cooldown es un "ajuste"; todas se evalúan juntas como una matriz
+ajustes × símbolos × fechas. El cooldown se simula igual que _can_send/_mark_sent: una alerta
+solo vuelve a contar cuando pasaron `cooldown` segundos desde la última. Las barras diarias
+se toman al cierre, así que un cooldown menor a un día equivale a una alerta por día.
+El ATH de sp500 es el máximo acumulado dentro de la ventana de --years.
+"""
+import argparse
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from investment import indicators, price_cache
+from investment import sp500, stocks
+
+# ============== CONFIG ==============
+DEFAULT_YEARS = 10
+SP500_COOLDOWN_S = sp500.ALERT_COOLDOWN_S   # cooldown por índice, como en sp500.main
+RULE_CHOICES = ["ema200", "sp500"] + list(indicators.RULES)
+# ===================================
+
+@dataclass
+class Setting:
+    label: str
+    thresholds: np.ndarray      # por símbolo (NaN = regla apagada)
+    cooldowns: np.ndarray       # segundos, por símbolo
+
+def simulate_cooldown(hit: np.ndarray, times: np.ndarray, cooldown_s: np.ndarray) -> np.ndarray:
+    """
+    hit (..., T) booleano; times (T,) en segundos; cooldown_s con la forma hit.shape[:-1].
+    Devuelve qué señales se habrían enviado: una sola pasada sobre las fechas, vectorizada
+    sobre todas las demás dimensiones (ajustes, símbolos).
+    """
+    fired = np.zeros(hit.shape, dtype=bool)
+    next_ok = np.full(hit.shape[:-1], -np.inf)
+    for t in range(hit.shape[-1]):
+        f = hit[..., t] & (times[t] >= next_ok)
+        fired[..., t] = f
+        next_ok = np.where(f, times[t] + cooldown_s, next_ok)
+    return fired
+
+def _cross_series(m: np.ndarray, death: bool) -> np.ndarray:
+    spread = indicators.sma(m, indicators.SMA_FAST) - indicators.sma(m, indicators.SMA_SLOW)
+    out = np.zeros(m.shape, dtype=bool)
+    prev, cur = spread[:, :-1], spread[:, 1:]
+    with np.errstate(invalid="ignore"):
+        out[:, 1:] = (prev >= 0) & (cur < 0) if death else (prev <= 0) & (cur > 0)
+    return out
+
+def rule_values(rule: str, m: np.ndarray) -> np.ndarray:
+    """Serie completa (símbolos × fechas) del valor que compara cada regla."""
+    f = indicators.ffill(m)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if rule == "ema200":
+            # % por debajo de la EMA200, como en stocks._maybe_alert; sin señal durante las
+            # primeras EMA_SPAN barras de cada símbolo (la EMA aún no se asienta)
+            below = (1.0 - f / indicators.ema(m, stocks.EMA_SPAN)) * 100.0
+            seen = np.cumsum(~np.isnan(m), axis=1)
+            return np.where(seen >= stocks.EMA_SPAN, below, np.nan)
+        if rule == "sp500":
+            # caída desde el máximo acumulado, como en sp500.main
+            ath = np.fmax.accumulate(f, axis=1)
+            return (ath - f) / ath * 100.0
+        if rule == "rsi_below":
+            return indicators.rsi(m)
+        if rule == "zscore_below":
+            return indicators.zscore(m)
+        if rule == "drawdown_pct":
+            return (1.0 - f / indicators.rolling_max(m, indicators.HIGH_WINDOW)) * 100.0
+        if rule in ("death_cross", "golden_cross"):
+            return _cross_series(m, rule == "death_cross").astype(np.float64)
+    raise ValueError(f"Regla desconocida: {rule}")
+
+def _hits(rule: str, values: np.ndarray, thr: np.ndarray) -> np.ndarray:
+    """values (S, T), thr (G, S) -> (G, S, T)."""
+    v = values[None, :, :]
+    t = thr[:, :, None]
+    with np.errstate(invalid="ignore"):
+        if rule in ("ema200", "sp500", "drawdown_pct"):
+            return v >= t
+        if rule in ("rsi_below", "zscore_below"):
+            return v <= t
+        return (v > 0) & (np.nan_to_num(t) != 0)
+
+def _configured(rule: str, symbols: List[str]) -> Setting:
+    """Ajuste con los umbrales y cooldowns actuales de stocks.py / sp500.py."""
+    if rule == "sp500":
+        thr = np.full(len(symbols), float(sp500.DEFAULT_THRESHOLD))
+        cd = np.full(len(symbols), float(SP500_COOLDOWN_S))
+        return Setting("actual", thr, cd)
+    if rule == "ema200":
+        thr = np.array([stocks._threshold_for(s) for s in symbols], dtype=np.float64)
+    else:
+        thr = indicators.thresholds(symbols, rule, stocks.INDICATOR_RULES.get(rule),
+                                    stocks.SYMBOL_INDICATOR_THRESHOLDS)
+    cd = np.array([stocks._cooldown_for(s) for s in symbols], dtype=np.float64)
+    return Setting("actual", thr, cd)
+
+def build_settings(rule: str, symbols: List[str], thresholds: Sequence[float],
+                   cooldowns: Sequence[float]) -> List[Setting]:
+    """La config actual más cada combinación umbral × cooldown (umbral/cooldown ausentes = los actuales)."""
+    base = _configured(rule, symbols)
+    settings = [base]
+    for thr in (thresholds or [None]):
+        for cd in (cooldowns or [None]):
+            if thr is None and cd is None:
+                continue
+            t = base.thresholds if thr is None else np.full(len(symbols), float(thr))
+            c = base.cooldowns if cd is None else np.full(len(symbols), float(cd))
+            label = f"umbral={'actual' if thr is None else thr} cooldown={'actual' if cd is None else f'{int(cd)}s'}"
+            settings.append(Setting(label, t, c))
+    return settings
+
+def replay(rule: str, closes: pd.DataFrame, settings: List[Setting]) -> Dict[str, np.ndarray]:
+    """
+    Evalúa todos los ajustes a la vez. Devuelve {"fired": (G, S, T) bool, "values": (S, T)}.
+    """
+    m, _, dates = indicators.matrix(closes)
+    values = rule_values(rule, m)
+    thr = np.stack([s.thresholds for s in settings])
+    cd = np.stack([s.cooldowns for s in settings])
+    hit = _hits(rule, values, thr)
+    # barras diarias al cierre (16:00), en segundos
+    times = pd.DatetimeIndex(dates).values.astype("datetime64[s]").astype(np.float64) + 16 * 3600
+    fired = simulate_cooldown(hit, times, cd)
+    return {"fired": fired, "values": values}
+
+def summarize(settings: List[Setting], symbols: List[str], dates: pd.Index,
+              fired: np.ndarray) -> pd.DataFrame:
+    """Una fila por ajuste: alertas totales, símbolos con alerta, primera y última fecha."""
+    rows = []
+    for g, s in enumerate(settings):
+        f = fired[g]
+        cols = np.flatnonzero(f.any(axis=0))
+        rows.append({
+            "ajuste": s.label,
+            "alertas": int(f.sum()),
+            "símbolos": int(f.any(axis=1).sum()),
+            "primera": dates[cols[0]].strftime("%Y-%m-%d") if cols.size else "-",
+            "última": dates[cols[-1]].strftime("%Y-%m-%d") if cols.size else "-",
+        })
+    return pd.DataFrame(rows)
+
+def events(settings: List[Setting], symbols: List[str], dates: pd.Index,
+           fired: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+    """Todas las alertas que se habrían enviado: (ajuste, símbolo, fecha, valor)."""
+    g, s, t = np.nonzero(fired)
+    return pd.DataFrame({
+        "ajuste": [settings[i].label for i in g],
+        "símbolo": [symbols[i] for i in s],
+        "fecha": [dates[i].strftime("%Y-%m-%d") for i in t],
+        "valor": values[s, t].round(2),
+    })
+
+def _floats(text: Optional[str]) -> List[float]:
+    return [float(x) for x in text.split(",") if x.strip()] if text else []
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(prog="python -m investment.backtest", description=__doc__.split("\n\n")[0])
+    p.add_argument("--rule", choices=RULE_CHOICES, default="ema200")
+    p.add_argument("--symbols", help="lista separada por comas (por defecto TICKERS o INDEX_TICKERS)")
+    p.add_argument("--thresholds", help="rejilla de umbrales, p. ej. 10,15,20")
+    p.add_argument("--cooldowns", help="rejilla de cooldowns en segundos, p. ej. 86400,604800")
+    p.add_argument("--years", type=float, default=DEFAULT_YEARS)
+    p.add_argument("--refresh", action="store_true", help="descargar antes el histórico que falte")
+    p.add_argument("--detail", action="store_true", help="listar cada alerta con su fecha")
+    p.add_argument("--csv", help="guardar todas las alertas en este archivo CSV")
+    args = p.parse_args(argv)
+
+    if args.symbols:
+        symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    else:
+        symbols = list(sp500.INDEX_TICKERS if args.rule == "sp500" else stocks.TICKERS)
+    period = f"{int(args.years * 365.25)}d"
+    adjusted = sp500.USE_ADJ_CLOSE if args.rule == "sp500" else stocks.USE_ADJ_CLOSE   # la misma base que en vivo
+
+    if args.refresh:
+        for sym, err in price_cache.refresh(symbols, period=period, interval=stocks.YF_INTERVAL,
+                                            auto_adjust=adjusted).items():
+            print(f"⚠️  [{sym}] {err}", file=sys.stderr)
+    closes = price_cache.closes(symbols, period=period, interval=stocks.YF_INTERVAL, auto_adjust=adjusted)
+    if closes.empty:
+        print("Sin histórico en la caché; usa --refresh.", file=sys.stderr)
+        return 1
+    empty = [s for s in symbols if closes[s].dropna().empty]
+    if empty:
+        print(f"⚠️  Sin histórico: {', '.join(empty)}", file=sys.stderr)
+
+    settings = build_settings(args.rule, symbols, _floats(args.thresholds), _floats(args.cooldowns))
+    out = replay(args.rule, closes, settings)
+
+    print(f"Regla {args.rule}: {len(symbols)} símbolos, {len(closes)} barras "
+          f"({closes.index[0]:%Y-%m-%d} a {closes.index[-1]:%Y-%m-%d}), {len(settings)} ajustes")
+    print(summarize(settings, symbols, closes.index, out["fired"]).to_string(index=False))
+
+    if args.detail or args.csv:
+        ev = events(settings, symbols, closes.index, out["fired"], out["values"])
+        if args.detail:
+            print()
+            print(ev.to_string(index=False))
+        if args.csv:
+            ev.to_csv(args.csv, index=False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
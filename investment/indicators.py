@@ -0,0 +1,195 @@
+# File: investment/indicators.py
+"""
+Motor de indicadores vectorizado sobre una matriz de cierres símbolos × fechas.
+
+Cada indicador se calcula para TODOS los símbolos a la vez con NumPy (las recursiones
+como EMA/RSI recorren las fechas una vez, con operaciones vectoriales por símbolo).
+Los huecos (NaN) se rellenan hacia adelante; las fechas previas al primer cierre de un
+símbolo (IPO) quedan en NaN y los indicadores sin suficiente historia también.
+
+Uso típico:
+    snap = indicators.snapshot(closes)                  # DataFrame símbolo -> indicadores
+    for sig in indicators.signals(snap, rules, per_symbol): ...
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ============== CONFIG ==============
+RSI_PERIOD = 14
+SMA_FAST = 50
+SMA_SLOW = 200
+HIGH_WINDOW = 252          # ~52 semanas de barras diarias
+ZSCORE_WINDOW = 20
+
+# regla -> (columna del snapshot, comparación); "le": valor <= umbral, "ge": valor >= umbral,
+# "flag": el indicador es booleano y el umbral solo lo activa (0/None = apagado)
+RULES: Dict[str, Tuple[str, str]] = {
+    "rsi_below": ("rsi", "le"),
+    "zscore_below": ("zscore", "le"),
+    "drawdown_pct": ("drawdown_pct", "ge"),
+    "death_cross": ("death_cross", "flag"),
+    "golden_cross": ("golden_cross", "flag"),
+}
+# ===================================
+
+@dataclass
+class Signal:
+    symbol: str
+    rule: str
+    value: float
+    threshold: float
+
+def matrix(closes: pd.DataFrame) -> Tuple[np.ndarray, List[str], pd.Index]:
+    """DataFrame fechas × símbolos -> (matriz float64 símbolos × fechas, símbolos, fechas)."""
+    return closes.to_numpy(dtype=np.float64).T.copy(), [str(c) for c in closes.columns], closes.index
+
+def ffill(m: np.ndarray) -> np.ndarray:
+    """Rellena NaN con el último valor válido de la fila (los NaN iniciales se conservan)."""
+    valid = ~np.isnan(m)
+    idx = np.where(valid, np.arange(m.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return m[np.arange(m.shape[0])[:, None], idx]
+
+def _rolling_sums(m: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(suma, conteo de válidos) de las últimas n columnas en cada posición."""
+    valid = ~np.isnan(m)
+    z = np.where(valid, m, 0.0)
+    c = np.zeros((m.shape[0], m.shape[1] + 1))
+    k = np.zeros_like(c)
+    np.cumsum(z, axis=1, out=c[:, 1:])
+    np.cumsum(valid, axis=1, out=k[:, 1:])
+    s = np.full(m.shape, np.nan)
+    cnt = np.zeros(m.shape)
+    if m.shape[1] >= n:
+        s[:, n - 1:] = c[:, n:] - c[:, :-n]
+        cnt[:, n - 1:] = k[:, n:] - k[:, :-n]
+    return s, cnt
+
+def sma(m: np.ndarray, n: int) -> np.ndarray:
+    """Media móvil simple de n barras (NaN hasta tener n cierres)."""
+    f = ffill(m)
+    s, cnt = _rolling_sums(f, n)
+    return np.where(cnt == n, s / n, np.nan)
+
+def ema(m: np.ndarray, span: int) -> np.ndarray:
+    """EMA equivalente a ewm(span, adjust=False), sembrada con el primer cierre de cada símbolo."""
+    alpha = 2.0 / (span + 1)
+    f = ffill(m)
+    out = np.empty_like(f)
+    prev = f[:, 0].copy()
+    out[:, 0] = prev
+    for t in range(1, f.shape[1]):
+        x = f[:, t]
+        prev = np.where(np.isnan(prev), x, prev + alpha * (x - prev))
+        out[:, t] = prev
+    return out
+
+def rsi(m: np.ndarray, n: int = RSI_PERIOD) -> np.ndarray:
+    """RSI de Wilder (suavizado alpha=1/n); NaN hasta tener n variaciones."""
+    f = ffill(m)
+    d = np.diff(f, axis=1)
+    gain = np.where(d > 0, d, 0.0)
+    loss = np.where(d < 0, -d, 0.0)
+    gain[np.isnan(d)] = np.nan
+    loss[np.isnan(d)] = np.nan
+    ag = np.full(f.shape[0], np.nan)
+    al = np.full(f.shape[0], np.nan)
+    seen = np.zeros(f.shape[0])
+    out = np.full(f.shape, np.nan)
+    for t in range(d.shape[1]):
+        g, l = gain[:, t], loss[:, t]
+        ok = ~np.isnan(g)
+        ag = np.where(ok, np.where(np.isnan(ag), g, ag + (g - ag) / n), ag)
+        al = np.where(ok, np.where(np.isnan(al), l, al + (l - al) / n), al)
+        seen += ok
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.where(al == 0, 100.0, 100.0 - 100.0 / (1.0 + ag / al))
+        out[:, t + 1] = np.where(seen >= n, r, np.nan)
+    return out
+
+def rolling_max(m: np.ndarray, n: int) -> np.ndarray:
+    """Máximo de las últimas n barras (ignora NaN)."""
+    f = ffill(m)
+    padded = np.concatenate([np.full((f.shape[0], n - 1), np.nan), f], axis=1)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, n, axis=1)
+    return np.fmax.reduce(windows, axis=2)
+
+def zscore(m: np.ndarray, n: int = ZSCORE_WINDOW) -> np.ndarray:
+    """(cierre - media n) / desviación estándar n (poblacional); NaN sin n cierres o sin variación."""
+    f = ffill(m)
+    s, cnt = _rolling_sums(f, n)
+    s2, _ = _rolling_sums(f * f, n)
+    mean = s / n
+    var = np.maximum(s2 / n - mean * mean, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (f - mean) / np.sqrt(var)
+    return np.where((cnt == n) & (var > 0), z, np.nan)
+
+def snapshot(closes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Indicadores en la última barra para cada símbolo (índice = símbolo):
+    close, sma_fast, sma_slow, rsi, high_52w, drawdown_pct, zscore, death_cross, golden_cross.
+    """
+    m, symbols, _ = matrix(closes)
+    return snapshot_arrays(m, symbols)
+
+def snapshot_arrays(m: np.ndarray, symbols: List[str]) -> pd.DataFrame:
+    """snapshot() sobre una matriz símbolos × fechas (p. ej. price_cache.CloseArrays.values, float32)."""
+    m = np.asarray(m, dtype=np.float64)
+    if m.shape[1] == 0:
+        return pd.DataFrame(index=symbols)
+    close = ffill(m)[:, -1]
+    fast, slow = sma(m, SMA_FAST), sma(m, SMA_SLOW)
+    spread = fast[:, -2:] - slow[:, -2:] if m.shape[1] >= 2 else np.full((m.shape[0], 2), np.nan)
+    high = rolling_max(m, HIGH_WINDOW)[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = (1.0 - close / high) * 100.0
+    return pd.DataFrame({
+        "close": close,
+        "sma_fast": fast[:, -1],
+        "sma_slow": slow[:, -1],
+        "rsi": rsi(m)[:, -1],
+        "high_52w": high,
+        "drawdown_pct": drawdown,
+        "zscore": zscore(m)[:, -1],
+        "death_cross": (spread[:, 0] >= 0) & (spread[:, 1] < 0),
+        "golden_cross": (spread[:, 0] <= 0) & (spread[:, 1] > 0),
+    }, index=symbols)
+
+def thresholds(symbols: List[str], rule: str, default: Optional[float],
+               per_symbol: Dict[str, Dict[str, float]]) -> np.ndarray:
+    """Vector de umbrales de una regla por símbolo (NaN = regla apagada)."""
+    out = []
+    for sym in symbols:
+        v = per_symbol.get(sym.upper(), {}).get(rule, default)
+        out.append(np.nan if v is None else float(v))
+    return np.array(out, dtype=np.float64)
+
+def signals(snap: pd.DataFrame, rules: Dict[str, Optional[float]],
+            per_symbol: Optional[Dict[str, Dict[str, float]]] = None) -> List[Signal]:
+    """
+    Candidatos a alerta: una comparación vectorial por regla contra el vector de umbrales
+    (el de la regla en `rules`, sobrescrito por `per_symbol[SYM][regla]`).
+    """
+    per_symbol = per_symbol or {}
+    symbols = list(snap.index)
+    out: List[Signal] = []
+    for rule in RULES:
+        if rule not in rules and not any(rule in v for v in per_symbol.values()):
+            continue
+        column, op = RULES[rule]
+        thr = thresholds(symbols, rule, rules.get(rule), per_symbol)
+        values = snap[column].to_numpy(dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            if op == "le":
+                hit = values <= thr
+            elif op == "ge":
+                hit = values >= thr
+            else:
+                hit = (values > 0) & (np.nan_to_num(thr) != 0)
+        for i in np.flatnonzero(hit):
+            out.append(Signal(symbols[i], rule, float(values[i]), float(thr[i])))
+    return out
@@ -0,0 +1,379 @@
+# investment/price_cache.py
+"""
+Caché local de precios OHLCV (SQLite) compartida por investment.sp500 e investment.stocks.
+
+- Llave: (símbolo, intervalo, ajustado).
+- refresh() solo descarga lo que falta: el histórico completo la primera vez (o si se pide
+  un periodo más largo que el guardado) y, después, únicamente las barras desde la última
+  guardada, en peticiones multi-ticker.
+- Las descargas se guardan por bloque de BATCH_SIZE símbolos: nunca se tienen en memoria
+  los DataFrames de toda la lista a la vez.
+- history() / closes() leen siempre del disco, sin red.
+- close_arrays() / iter_close_arrays(): solo cierres, como arreglos compactos (fechas int64 +
+  matriz CLOSE_DTYPE), en bloques de símbolos que caben en un presupuesto de memoria.
+- Frescura explícita: la barra del día expira a los FRESH_TODAY_MIN minutos; si la última
+  barra guardada es de un día anterior, se vuelve a consultar cada FRESH_PAST_MIN minutos.
+"""
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utilities import metrics
+
+try:
+    from zoneinfo import ZoneInfo  # Py 3.9+
+except Exception:
+    ZoneInfo = None
+
+# ============== CONFIG ==============
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DB_PATH = DATA_DIR / "prices.sqlite3"
+MARKET_TZ = "America/New_York"
+
+FRESH_TODAY_MIN: float = 15     # la barra de hoy (incompleta) se refresca cada N minutos
+FRESH_PAST_MIN: float = 60      # sin barra de hoy, se vuelve a preguntar cada N minutos
+ADJUST_TOLERANCE_PCT: float = 0.5   # si la última barra guardada cambió más que esto (split/dividendo), se recarga todo
+BATCH_SIZE: int = 25            # símbolos por petición multi-ticker
+CLOSE_DTYPE = np.float32        # cierres compactos (~7 dígitos, error relativo ~6e-8); lo que se acumula
+                                # o se guarda (estado de la EMA) pide dtype=np.float64
+BYTES_PER_BAR: int = 256        # memoria estimada por barra y símbolo en el paso más caro (fila de SQLite
+                                # mientras se arma la matriz, o temporales float64 de investment.indicators)
+# ===================================
+
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    symbol TEXT NOT NULL, interval TEXT NOT NULL, adjusted INTEGER NOT NULL, date TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (symbol, interval, adjusted, date)
+);
+CREATE TABLE IF NOT EXISTS series (
+    symbol TEXT NOT NULL, interval TEXT NOT NULL, adjusted INTEGER NOT NULL,
+    last_date TEXT, period_days INTEGER, fetched_at REAL,
+    PRIMARY KEY (symbol, interval, adjusted)
+);
+"""
+
+def _connect() -> sqlite3.Connection:
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(DB_PATH, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(_SCHEMA)
+    return con
+
+def _period_days(period: str) -> int:
+    """'400d' -> 400 (solo se aceptan periodos en días)."""
+    p = str(period).strip().lower()
+    if not p.endswith("d"):
+        raise ValueError(f"Periodo no soportado por la caché: {period}")
+    return int(p[:-1])
+
+def _market_today() -> str:
+    now = datetime.now(ZoneInfo(MARKET_TZ)) if ZoneInfo else datetime.now()
+    return now.strftime("%Y-%m-%d")
+
+def _bar_key(ts, interval: str) -> str:
+    if interval.endswith(("d", "wk", "mo")):
+        return ts.strftime("%Y-%m-%d")
+    return ts.isoformat()
+
+def _is_fresh(last_date: Optional[str], fetched_at: Optional[float], now: float, today: str,
+              max_age_min: Optional[float]) -> bool:
+    if not fetched_at:
+        return False
+    if max_age_min is None:
+        max_age_min = FRESH_TODAY_MIN if (last_date or "")[:10] == today else FRESH_PAST_MIN
+    return (now - fetched_at) <= max_age_min * 60
+
+def _yf():
+    """yfinance se importa solo al descargar (las lecturas de la caché no lo necesitan)."""
+    import yfinance
+    return yfinance
+
+def _download_batches(symbols: List[str], span: dict, interval: str, auto_adjust: bool
+                      ) -> Iterator[Tuple[Dict[str, pd.DataFrame], Dict[str, str]]]:
+    """yf.download multi-ticker por bloques de BATCH_SIZE; cede ({símbolo: OHLCV}, {símbolo: error}) por bloque."""
+    yf = _yf()
+    for i in range(0, len(symbols), BATCH_SIZE):
+        chunk = symbols[i:i + BATCH_SIZE]
+        frames: Dict[str, pd.DataFrame] = {}
+        errors: Dict[str, str] = {}
+        try:
+            with metrics.timer("yfinance_download_seconds", io=True, span=next(iter(span)), interval=interval):
+                data = yf.download(
+                    chunk, **span, interval=interval, auto_adjust=auto_adjust,
+                    group_by="ticker", progress=False, threads=True,
+                )
+        except Exception as e:
+            metrics.incr("yfinance_errors_total", n=len(chunk), kind=type(e).__name__)
+            yield frames, {sym: str(e) for sym in chunk}
+            continue
+        metrics.incr("yfinance_symbols_total", n=len(chunk), span=next(iter(span)))
+        if data is None or data.empty:
+            yield frames, {sym: "Hist vacío" for sym in chunk}
+            continue
+
+        yf_errors = getattr(getattr(yf, "shared", None), "_ERRORS", {}) or {}
+        multi = isinstance(data.columns, pd.MultiIndex)
+        for sym in chunk:
+            if multi:
+                if sym not in data.columns.get_level_values(0):
+                    errors[sym] = str(yf_errors.get(sym, "Hist vacío"))
+                    continue
+                df = data[sym]
+            else:
+                df = data  # un solo símbolo sin MultiIndex
+            if "Close" not in df.columns and "Adj Close" in df.columns:
+                df = df.rename(columns={"Adj Close": "Close"})
+            df = df.reindex(columns=FIELDS).dropna(subset=["Close"])
+            if df.empty:
+                errors[sym] = str(yf_errors.get(sym, "Hist vacío"))
+                continue
+            frames[sym] = df
+        yield frames, errors
+
+def _download(symbols: List[str], span: dict, interval: str, auto_adjust: bool
+              ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """Todos los bloques de _download_batches juntos (solo para descargas chicas, p. ej. quotes())."""
+    frames: Dict[str, pd.DataFrame] = {}
+    errors: Dict[str, str] = {}
+    for f, e in _download_batches(symbols, span, interval, auto_adjust):
+        frames.update(f)
+        errors.update(e)
+    return frames, errors
+
+def _store(con: sqlite3.Connection, sym: str, interval: str, adj: int, df: pd.DataFrame,
+           period_days: int, fetched_at: float, replace: bool) -> None:
+    if replace:
+        con.execute("DELETE FROM bars WHERE symbol=? AND interval=? AND adjusted=?", (sym, interval, adj))
+    rows = [
+        (sym, interval, adj, _bar_key(ts, interval), *(None if pd.isna(v) else float(v) for v in vals))
+        for ts, vals in zip(df.index, df[FIELDS].itertuples(index=False, name=None))
+    ]
+    con.executemany("INSERT OR REPLACE INTO bars VALUES (?,?,?,?,?,?,?,?,?)", rows)
+    last = con.execute(
+        "SELECT MAX(date) FROM bars WHERE symbol=? AND interval=? AND adjusted=?", (sym, interval, adj)
+    ).fetchone()[0]
+    con.execute(
+        "INSERT OR REPLACE INTO series VALUES (?,?,?,?,?,?)",
+        (sym, interval, adj, last, period_days, fetched_at),
+    )
+
+def _anchor_moved(con: sqlite3.Connection, sym: str, interval: str, adj: int, df: pd.DataFrame) -> bool:
+    """True si el cierre de la última barra guardada cambió en la descarga nueva (split/ajuste)."""
+    row = con.execute(
+        "SELECT date, close FROM bars WHERE symbol=? AND interval=? AND adjusted=? ORDER BY date DESC LIMIT 1",
+        (sym, interval, adj),
+    ).fetchone()
+    if not row:
+        return True
+    keys = [_bar_key(ts, interval) for ts in df.index]
+    if row[0] not in keys:
+        return True
+    new_close = float(df["Close"].iloc[keys.index(row[0])])
+    return abs(new_close - row[1]) / row[1] * 100.0 > ADJUST_TOLERANCE_PCT
+
+def refresh(symbols: List[str], period: str = "400d", interval: str = "1d", auto_adjust: bool = True,
+            max_age_min: Optional[float] = None) -> Dict[str, str]:
+    """
+    Asegura que la caché cubra `period` para cada símbolo y esté fresca.
+    Devuelve {símbolo: error} para los que no se pudieron actualizar (se sigue sirviendo lo guardado).
+    """
+    days = _period_days(period)
+    adj = int(bool(auto_adjust))
+    now = time.time()
+    today = _market_today()
+    errors: Dict[str, str] = {}
+
+    con = _connect()
+    try:
+        marks = ",".join("?" * len(symbols))
+        meta = {
+            row[0]: row[1:]
+            for row in con.execute(
+                f"SELECT symbol, last_date, period_days, fetched_at FROM series "
+                f"WHERE interval=? AND adjusted=? AND symbol IN ({marks})",
+                (interval, adj, *symbols),
+            )
+        }
+        full = [s for s in symbols if s not in meta or (meta[s][1] or 0) < days]
+        tail = [s for s in symbols if s not in full and not _is_fresh(meta[s][0], meta[s][2], now, today, max_age_min)]
+
+        if tail:
+            # desde la última barra guardada (se vuelve a pedir para validar ajustes)
+            start = min(meta[s][0] for s in tail)[:10]
+            for frames, errs in _download_batches(tail, {"start": start}, interval, auto_adjust):
+                errors.update(errs)
+                with con:
+                    for sym, df in frames.items():
+                        if _anchor_moved(con, sym, interval, adj, df):
+                            full.append(sym)
+                            continue
+                        _store(con, sym, interval, adj, df, meta[sym][1], now, replace=False)
+
+        if full:
+            want = max([days] + [meta[s][1] or 0 for s in full if s in meta])
+            for frames, errs in _download_batches(full, {"period": f"{want}d"}, interval, auto_adjust):
+                errors.update(errs)
+                with con:
+                    for sym, df in frames.items():
+                        errors.pop(sym, None)
+                        _store(con, sym, interval, adj, df, want, now, replace=True)
+    finally:
+        con.close()
+    return errors
+
+def quotes(symbols: List[str], auto_adjust: bool = True) -> Tuple[Dict[str, Tuple[str, float]], Dict[str, str]]:
+    """
+    Último precio de cada símbolo con una sola petición multi-ticker de la barra diaria en
+    curso (una fila por símbolo). No se guarda en la caché.
+    Devuelve ({símbolo: (fecha de la barra, precio)}, {símbolo: error}).
+    """
+    frames, errors = _download(symbols, {"period": "1d"}, "1d", auto_adjust)
+    out = {sym: (_bar_key(df.index[-1], "1d"), float(df["Close"].iloc[-1])) for sym, df in frames.items()}
+    return out, errors
+
+def _start_for(period: Optional[str], start: Optional[str]) -> str:
+    if start:
+        return start
+    if period:
+        return (pd.Timestamp(_market_today()) - pd.Timedelta(days=_period_days(period))).strftime("%Y-%m-%d")
+    return ""
+
+def history(symbol: str, period: Optional[str] = "400d", interval: str = "1d", auto_adjust: bool = True,
+            start: Optional[str] = None) -> pd.DataFrame:
+    """OHLCV guardado de un símbolo (índice de fechas), desde `start` o los últimos `period` días."""
+    con = _connect()
+    try:
+        df = pd.read_sql_query(
+            "SELECT date, open, high, low, close, volume FROM bars "
+            "WHERE symbol=? AND interval=? AND adjusted=? AND date>=? ORDER BY date",
+            con, params=(symbol, interval, int(bool(auto_adjust)), _start_for(period, start)),
+        )
+    finally:
+        con.close()
+    df.columns = ["Date"] + FIELDS
+    return df.set_index(pd.to_datetime(df.pop("Date")))
+
+def closes(symbols: List[str], period: Optional[str] = "400d", interval: str = "1d", auto_adjust: bool = True,
+           start: Optional[str] = None) -> pd.DataFrame:
+    """Cierres guardados alineados por fecha, un símbolo por columna."""
+    con = _connect()
+    try:
+        marks = ",".join("?" * len(symbols))
+        df = pd.read_sql_query(
+            f"SELECT date, symbol, close FROM bars "
+            f"WHERE interval=? AND adjusted=? AND date>=? AND symbol IN ({marks}) ORDER BY date",
+            con, params=(interval, int(bool(auto_adjust)), _start_for(period, start), *symbols),
+        )
+    finally:
+        con.close()
+    frame = df.pivot(index="date", columns="symbol", values="close").reindex(columns=symbols)
+    frame.index = pd.to_datetime(frame.index)
+    return frame
+
+@dataclass
+class CloseArrays:
+    """
+    Cierres compactos de un bloque de símbolos: `days` son fechas como días desde 1970-01-01
+    (int64, ordenadas) y `values` la matriz símbolos × fechas en CLOSE_DTYPE (NaN = sin barra).
+    """
+    symbols: List[str]
+    days: np.ndarray
+    values: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + self.values.nbytes
+
+    def day(self, i: int) -> str:
+        """Fecha YYYY-MM-DD de la columna i."""
+        return from_day(self.days[i])
+
+    def frame(self) -> pd.DataFrame:
+        """DataFrame fechas × símbolos (vista para código que necesita pandas)."""
+        return pd.DataFrame(self.values.T, index=pd.to_datetime(self.days.astype("datetime64[D]")),
+                            columns=self.symbols)
+
+def to_day(date: str) -> int:
+    """'YYYY-MM-DD' -> días desde 1970-01-01 (la escala de CloseArrays.days)."""
+    return int(np.datetime64(date[:10], "D").astype(np.int64))
+
+def from_day(day: int) -> str:
+    """Días desde 1970-01-01 -> 'YYYY-MM-DD'."""
+    return str(np.int64(day).astype("datetime64[D]"))
+
+def _daily(interval: str) -> None:
+    if not interval.endswith(("d", "wk", "mo")):
+        raise ValueError(f"Cierres compactos solo para barras diarias o mayores: {interval}")
+
+def close_arrays(symbols: List[str], period: Optional[str] = "400d", interval: str = "1d",
+                 auto_adjust: bool = True, start: Optional[str] = None, dtype=CLOSE_DTYPE) -> CloseArrays:
+    """
+    Como closes(), pero sin pandas: fechas int64 y matriz `dtype` alineadas por fecha.
+    Pasar dtype=np.float64 cuando el resultado se acumula o se persiste (p. ej. estado de la EMA).
+    """
+    _daily(interval)
+    index = {sym: i for i, sym in enumerate(symbols)}
+    con = _connect()
+    try:
+        marks = ",".join("?" * len(symbols))
+        # fila por fila directo a un arreglo (sin lista de tuplas); SQLite convierte la fecha a días
+        cur = con.execute(
+            f"SELECT symbol, CAST(julianday(date) - 2440587.5 AS INTEGER), close FROM bars "
+            f"WHERE interval=? AND adjusted=? AND date>=? AND symbol IN ({marks}) AND close IS NOT NULL",
+            (interval, int(bool(auto_adjust)), _start_for(period, start), *symbols),
+        )
+        rows = np.fromiter(((index[sym], day, close) for sym, day, close in cur),
+                           dtype=[("sym", np.int64), ("day", np.int64), ("close", dtype)])
+    finally:
+        con.close()
+    days, col = np.unique(rows["day"], return_inverse=True)
+    values = np.full((len(symbols), len(days)), np.nan, dtype=dtype)
+    values[rows["sym"], col] = rows["close"]
+    return CloseArrays(list(symbols), days, values)
+
+def iter_close_arrays(symbols: List[str], budget_mb: float, period: Optional[str] = "400d",
+                      interval: str = "1d", auto_adjust: bool = True,
+                      start: Optional[str] = None, dtype=CLOSE_DTYPE) -> Iterator[CloseArrays]:
+    """
+    close_arrays() por bloques de símbolos: cada bloque se estima en a lo más `budget_mb`
+    (barras × BYTES_PER_BAR) y se suelta antes de leer el siguiente.
+    """
+    _daily(interval)
+    start = _start_for(period, start)
+    bars = max(1, (pd.Timestamp(_market_today()) - pd.Timestamp(start)).days + 1) if start else 0
+    if not bars:
+        con = _connect()
+        try:
+            first = con.execute("SELECT MIN(date) FROM bars WHERE interval=? AND adjusted=?",
+                                (interval, int(bool(auto_adjust)))).fetchone()[0]
+        finally:
+            con.close()
+        bars = max(1, (pd.Timestamp(_market_today()) - pd.Timestamp(first or _market_today())).days + 1)
+    if interval.endswith("d"):
+        bars = bars * 5 // 7 + 1   # solo días hábiles
+    step = max(1, int(budget_mb * 1048576 // (bars * BYTES_PER_BAR)))
+    for i in range(0, len(symbols), step):
+        yield close_arrays(symbols[i:i + step], None, interval, auto_adjust, start=start, dtype=dtype)
+
+def max_close(symbol: str, period: Optional[str] = None, interval: str = "1d", auto_adjust: bool = True,
+              start: Optional[str] = None) -> Tuple[Optional[float], Optional[str]]:
+    """(cierre máximo, fecha) guardado de un símbolo, calculado en SQLite sin cargar el histórico."""
+    con = _connect()
+    try:
+        row = con.execute(
+            # con MAX(), SQLite devuelve `date` de la misma fila del máximo
+            "SELECT MAX(close), date FROM bars WHERE symbol=? AND interval=? AND adjusted=? AND date>=?",
+            (symbol, interval, int(bool(auto_adjust)), _start_for(period, start)),
+        ).fetchone()
+    finally:
+        con.close()
+    return (row[0], row[1][:10]) if row and row[0] is not None else (None, None)
@@ -1,41 +1,104 @@
-import yfinance as yf
 import logging
 from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+from investment import price_cache
+from utilities import state_store
 from utilities.sender import send_discord_message, DISCORD_WEBHOOK_URL_INVESTING
 
 # Configuración
 INDEX_TICKER = "SPY"  # Ticker para el S&P 500 en Yahoo Finance
-ATH_VALUE = None  # si es None, se calculará automáticamente del histórico
+# Índices vigilados (cada uno con su propio ATH persistido)
+INDEX_TICKERS: List[str] = ["SPY", "QQQ", "DIA"]
+INDEX_NAMES: Dict[str, str] = {"SPY": "S&P500", "QQQ": "Nasdaq 100", "DIA": "Dow Jones"}
 DEFAULT_THRESHOLD = 2.0  # porcentaje de caída (por ejemplo, 2.0 significa caída ≥ 2.0%)
+RECENT_PERIOD = "5d"     # barras recientes con las que se actualiza el máximo en cada corrida
+ATH_SEED_DAYS = 3650     # histórico para sembrar el ATH la primera vez (solo una vez por índice)
+ALERT_COOLDOWN_S = 86400 # cooldown por índice: la alerta de uno no silencia a los demás
+# El ATH se guarda para siempre, así que se mide en cierres sin ajustar por dividendos
+# (yfinance sí ajusta splits): con cierres ajustados, cada dividendo baja el histórico pero
+# no el ATH guardado, y la caída aparente crece con el rendimiento acumulado.
+USE_ADJ_CLOSE: bool = False
 
-def fetch_current_price() -> float:
+# ATH por índice en utilities.state_store:
+#   {"SPY": {"ath": 612.3, "date": "2025-10-28", "adjusted": false, "alerted_at": "2025-11-03T10:30:00"}}
+# (las entradas de otra base, p. ej. sin "adjusted", se vuelven a sembrar)
+ATH_STATE_NS = "sp500.ath"
+ATH_STATE_FILE = Path(__file__).with_name(".sp500_ath_state.json")  # heredado, se importa una vez
+
+def fetch_current_price(ticker: str = INDEX_TICKER) -> float:
     """
-    Obtiene el precio de cierre más reciente del índice S&P 500.
+    Obtiene el precio de cierre más reciente del índice.
     """
     try:
-        ticker = yf.Ticker(INDEX_TICKER)
-        # Usamos history con period corto para obtener el precio más reciente
-        hist = ticker.history(period="5d", interval="1d", auto_adjust=True)
+        # Periodo corto: si la caché local ya cubre el ticker, solo se bajan las barras nuevas
+        price_cache.refresh([ticker], period=RECENT_PERIOD, interval="1d", auto_adjust=USE_ADJ_CLOSE)
+        hist = price_cache.history(ticker, period=RECENT_PERIOD, interval="1d", auto_adjust=USE_ADJ_CLOSE)
         if hist.empty:
             raise ValueError("No se pudo obtener histórico")
-        # Tomamos el último precio de cierre ajustado
+        # Último cierre (sin ajustar por dividendos si USE_ADJ_CLOSE es False, como el ATH)
         price = hist["Close"].iloc[-1]
         return float(price)
     except Exception as e:
         logging.error(f"Error al obtener precio actual: {e}")
         raise
 
-def compute_ath(threshold_days: int = 3650) -> float:
+def compute_ath(threshold_days: int = 3650, ticker: str = INDEX_TICKER) -> Tuple[float, str]:
     """
-    Calcula el ATH (máximo histórico) usando un histórico amplio.
+    Calcula el ATH (máximo histórico) y su fecha (YYYY-MM-DD) usando un histórico amplio.
     threshold_days indica cuántos días hacia atrás mirar (por ejemplo, 10 años ≈ 3650 días).
+    Solo se usa para sembrar el ATH persistido la primera vez que se ve un índice.
     """
-    ticker = yf.Ticker(INDEX_TICKER)
-    hist = ticker.history(period=f"{threshold_days}d", interval="1d", auto_adjust=True)
-    if hist.empty:
+    period = f"{threshold_days}d"
+    price_cache.refresh([ticker], period=period, interval="1d", auto_adjust=USE_ADJ_CLOSE)
+    # MAX en SQLite: no se carga el histórico de 10 años en memoria
+    ath, date = price_cache.max_close(ticker, period=period, interval="1d", auto_adjust=USE_ADJ_CLOSE)
+    if ath is None:
         raise ValueError("Histórico vacío para ATH")
-    ath = float(hist["Close"].max())
-    return ath
+    return float(ath), date
+
+def _load_ath_state() -> dict:
+    state_store.migrate_json(ATH_STATE_NS, ATH_STATE_FILE)
+    return state_store.get_all(ATH_STATE_NS)
+
+def _save_ath_state(state: dict, tickers: List[str]) -> None:
+    state_store.put_many(ATH_STATE_NS, {t: state[t] for t in tickers})
+
+def _seeded(ticker: str, state: dict) -> bool:
+    """True si el índice ya tiene ATH guardado en la base de cierres actual (USE_ADJ_CLOSE)."""
+    entry = state.get(ticker)
+    return entry is not None and entry.get("adjusted", True) == USE_ADJ_CLOSE
+
+def _update_ath(ticker: str, state: dict) -> Tuple[float, float]:
+    """
+    Actualiza el máximo acumulado del índice solo con las barras recientes.
+    Devuelve (precio_actual, ath).
+    """
+    hist = price_cache.history(ticker, period=RECENT_PERIOD, interval="1d", auto_adjust=USE_ADJ_CLOSE)
+    if hist.empty:
+        raise ValueError("No se pudo obtener histórico")
+    closes = hist["Close"]
+    current = float(closes.iloc[-1])
+
+    entry = state.get(ticker)
+    if not _seeded(ticker, state):
+        # primera vez (o guardado en otra base): se siembra desde el histórico largo (queda en la caché local)
+        ath, date = compute_ath(ATH_SEED_DAYS, ticker=ticker)
+        entry = {"ath": ath, "date": date, "adjusted": USE_ADJ_CLOSE}
+
+    top = float(closes.max())
+    if top > entry["ath"]:
+        entry = {**entry, "ath": top, "date": closes.idxmax().strftime("%Y-%m-%d")}
+    state[ticker] = entry
+    return current, entry["ath"]
+
+def _in_cooldown(entry: dict, now: datetime) -> bool:
+    """True si el índice alertó hace menos de ALERT_COOLDOWN_S."""
+    try:
+        last = datetime.fromisoformat(entry["alerted_at"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return (now - last).total_seconds() < ALERT_COOLDOWN_S
 
 def main(threshold: float = DEFAULT_THRESHOLD) -> bool:
     """
@@ -43,43 +106,49 @@ def main(threshold: float = DEFAULT_THRESHOLD) -> bool:
 
     threshold: porcentaje mínimo de caída desde el ATH para activar cooldown.
 
-    Retorna True si la caída ≥ threshold, o False si no.
+    Retorna True si algún índice alertó (cae ≥ threshold y no está en su cooldown), o False si no.
     """
-    try:
-        now = datetime.now()
-        current = fetch_current_price()
-        #print(f"Precio actual: {current}")                  
-
-        global ATH_VALUE
-        if ATH_VALUE is None:
-            # calcular ATH dinámico la primera vez
-            ath = compute_ath()
-            ATH_VALUE = ath
-            #print(f"ATH: {ATH_VALUE}")
-        else:
-            ath = ATH_VALUE
-            #print(f"Usando ATH fijo: {ath}")
-
-        # Calcular caída porcentual
-        # caída = (ATH - current) / ATH * 100
-        drop_pct = (ath - current) / ath * 100
-        #print(f"Caída desde ATH: {drop_pct:.4f}%")
-
-        if drop_pct >= threshold:
-            message = (
-                f"⚠️ **Alerta SP500** ⚠️\n"
-                f"El S&P500 ha caído **{drop_pct:.2f}%** desde su maximo historico de **{ATH_VALUE:.2f}**\n"
-                f"Precio actual: **{current:.2f}**\n"
-                f"Umbral configurado: {threshold}%\n"
-                f"**Tip:** Es buen momento para invertir! ✅"
-            )
-            send_discord_message(DISCORD_WEBHOOK_URL_INVESTING, message)
-            return True
-        else:
-            #print(f"Caída < {threshold}%, nada que hacer.")
-            return False
+    now = datetime.now()
+    state = _load_ath_state()
+    before = dict(state)
+    alerted = False
 
-    except Exception as e:
-        logging.error(f"Error en sp500.main: {e}")
-        send_discord_message(DISCORD_WEBHOOK_URL_INVESTING, f"❌ Error en sp500.py: {e}")
-        return False
+    errors = price_cache.refresh(INDEX_TICKERS, period=RECENT_PERIOD, interval="1d", auto_adjust=USE_ADJ_CLOSE)
+    # índices sin ATH guardado: un solo lote multi-ticker para sembrarlos
+    missing = [t for t in INDEX_TICKERS if not _seeded(t, state)]
+    if missing:
+        errors.update(price_cache.refresh(missing, period=f"{ATH_SEED_DAYS}d", interval="1d", auto_adjust=USE_ADJ_CLOSE))
+    for ticker, err in errors.items():
+        logging.error(f"[{ticker}] error al actualizar precios: {err}")
+
+    for ticker in INDEX_TICKERS:
+        name = INDEX_NAMES.get(ticker, ticker)
+        try:
+            current, ath = _update_ath(ticker, state)
+            #print(f"{ticker}: precio {current}, ATH {ath}")
+
+            # Calcular caída porcentual
+            # caída = (ATH - current) / ATH * 100
+            drop_pct = (ath - current) / ath * 100
+            #print(f"Caída desde ATH: {drop_pct:.4f}%")
+
+            if drop_pct >= threshold and not _in_cooldown(state[ticker], now):
+                message = (
+                    f"⚠️ **Alerta {name}** ⚠️\n"
+                    f"El {name} ({ticker}) ha caído **{drop_pct:.2f}%** desde su maximo historico de **{ath:.2f}**\n"
+                    f"Precio actual: **{current:.2f}**\n"
+                    f"Umbral configurado: {threshold}%\n"
+                    f"**Tip:** Es buen momento para invertir! ✅"
+                )
+                send_discord_message(DISCORD_WEBHOOK_URL_INVESTING, message)
+                state[ticker] = {**state[ticker], "alerted_at": now.isoformat(timespec="seconds")}
+                alerted = True
+
+        except Exception as e:
+            logging.error(f"Error en sp500.main ({ticker}): {e}")
+            send_discord_message(DISCORD_WEBHOOK_URL_INVESTING, f"❌ Error en sp500.py ({ticker}): {e}")
+
+    changed = [t for t in state if state[t] != before.get(t)]
+    if changed:
+        _save_ath_state(state, changed)
+    return alerted
@@ -1,16 +1,21 @@
 # stocks_ema200_alerts.py
 import logging
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
-import yfinance as yf
-import pandas as pd
+import numpy as np
 
+from investment import indicators, price_cache
+from utilities import market_calendar, state_store
 from utilities.sender import send_discord_message, DISCORD_WEBHOOK_URL_INVESTING
 from pathlib import Path
-import json
 from datetime import datetime, timedelta
 
+try:
+    from zoneinfo import ZoneInfo  # Py 3.9+
+except Exception:
+    ZoneInfo = None
+
 # Cooldown por símbolo (segundos)
 SYMBOL_COOLDOWN_S: dict[str, int] = {
     # si no está aquí, usará COOLDOWN_DEFAULT_S
@@ -28,7 +33,12 @@ SYMBOL_COOLDOWN_S: dict[str, int] = {
 }
 COOLDOWN_DEFAULT_S = 1800  # 30 min por defecto
 
+# Estado en utilities.state_store (los JSON heredados se importan una vez)
+STATE_NS = "stocks.cooldown"   # {"SYM": último envío ISO}
 STATE_FILE = Path(__file__).with_name(".stocks_ema200_state.json")
+# EMA200 incremental por símbolo: {"SYM": {"date": último cierre completo, "close": ..., "ema": ...}}
+EMA_STATE_NS = "stocks.ema200"
+EMA_STATE_FILE = Path(__file__).with_name(".stocks_ema200_values.json")
 
 # ============== CONFIG ==============
 # Lista de tickers a vigilar (puedes agregar/quitar)
@@ -57,27 +67,191 @@ EMA_SPAN: int = 200         # EMA de 200 días
 YF_PERIOD: str = "400d"     # historial para calcular correctamente EMA200
 YF_INTERVAL: str = "1d"
 USE_ADJ_CLOSE: bool = True  # usar cierre ajustado
+MARKET_TZ: str = "America/New_York"
+EMA_GAP_DAYS: int = 10              # si el último cierre guardado es más viejo, se reconstruye desde YF_PERIOD
+SPLIT_TOLERANCE_PCT: float = 0.5    # si el cierre guardado cambió más que esto (split/ajuste), se reconstruye
+# Entre cierres diarios solo se pide el último precio (una fila por símbolo) y se compara contra
+# la EMA200 guardada de la última barra completa; la ruta diaria corre una vez por sesión.
+FAST_QUOTES: bool = True
+# Los cierres se leen de la caché como arreglos compactos (fechas + CLOSE_DTYPE de price_cache)
+# y se procesan por bloques de símbolos que caben en este presupuesto (estimado con
+# price_cache.BYTES_PER_BAR); con pocos tickers todo cabe en un solo bloque.
+MEMORY_BUDGET_MB: float = 32.0
+
+# Reglas extra del motor de indicadores (investment/indicators.py), evaluadas para todos los
+# TICKERS en una pasada vectorizada. Todas apagadas (None) por defecto: para activar una, poner
+# su umbral, p. ej. "rsi_below": 25.0 o "death_cross": 1. Cooldown por "SYM:regla".
+INDICATOR_RULES: Dict[str, Optional[float]] = {
+    "rsi_below": None,       # RSI(14) <= valor
+    "drawdown_pct": None,    # % por debajo del máximo de 52 semanas >= valor
+    "zscore_below": None,    # z-score de 20 días <= valor
+    "death_cross": None,     # SMA50 cruza por debajo de SMA200 (1 = activa)
+    "golden_cross": None,    # SMA50 cruza por encima de SMA200 (1 = activa)
+}
+# Umbrales por símbolo que sobrescriben INDICATOR_RULES, p. ej. {"COIN": {"drawdown_pct": 50.0}}
+SYMBOL_INDICATOR_THRESHOLDS: Dict[str, Dict[str, Optional[float]]] = {}
 # ===================================
 
-def _get_hist(ticker: str) -> pd.DataFrame:
-    """Descarga histórico diario suficiente para EMA200."""
-    tkr = yf.Ticker(ticker)
-    hist = tkr.history(period=YF_PERIOD, interval=YF_INTERVAL, auto_adjust=USE_ADJ_CLOSE)
-    if hist is None or hist.empty:
-        raise ValueError(f"Hist vacío para {ticker}")
-    return hist
-
-def _last_price_and_ema200(hist: pd.DataFrame) -> Tuple[float, float]:
-    """Devuelve (precio_ultimo_cierre, ema200_ultimo)."""
-    close_col = "Close"
-    if close_col not in hist.columns:
-        # yfinance a veces regresa 'Adj Close' si no se autoajusta
-        close_col = "Adj Close" if "Adj Close" in hist.columns else hist.columns[-1]
-
-    ema = hist[close_col].ewm(span=EMA_SPAN, adjust=False).mean()
-    price = float(hist[close_col].iloc[-1])
-    ema200 = float(ema.iloc[-1])
-    return price, ema200
+def _cached_closes(symbols: List[str], start: Optional[str] = None,
+                   dtype=price_cache.CLOSE_DTYPE) -> Iterator[price_cache.CloseArrays]:
+    """Cierres de la caché local (sin red) en bloques de a lo más MEMORY_BUDGET_MB."""
+    return price_cache.iter_close_arrays(symbols, MEMORY_BUDGET_MB, period=YF_PERIOD, interval=YF_INTERVAL,
+                                         auto_adjust=USE_ADJ_CLOSE, start=start, dtype=dtype)
+
+def _download_closes(symbols: List[str], start: Optional[str] = None,
+                     dtype=price_cache.CLOSE_DTYPE) -> Iterator[price_cache.CloseArrays]:
+    """
+    Cierres de varios símbolos servidos por la caché local (price_cache), que solo baja
+    de Yahoo lo que falta (multi-ticker). Con start (YYYY-MM-DD) solo regresa desde esa fecha.
+    Cede bloques compactos de símbolos (ver _cached_closes); los errores se registran aquí.
+    """
+    errors = price_cache.refresh(symbols, period=YF_PERIOD, interval=YF_INTERVAL, auto_adjust=USE_ADJ_CLOSE)
+    for sym, err in errors.items():
+        logging.error(f"[{sym}] error: {err}")
+    for closes in _cached_closes(symbols, start, dtype):
+        for i in np.flatnonzero(np.isnan(closes.values).all(axis=1)):
+            if closes.symbols[i] not in errors:
+                logging.error(f"[{closes.symbols[i]}] error: Hist vacío")
+        yield closes
+
+def _market_today() -> str:
+    """Fecha actual del mercado (NY); la barra de hoy se considera incompleta."""
+    now = datetime.now(ZoneInfo(MARKET_TZ)) if ZoneInfo else datetime.now()
+    return now.strftime("%Y-%m-%d")
+
+def _ema_step(ema: float, close: float) -> float:
+    """Actualización recursiva equivalente a ewm(span=EMA_SPAN, adjust=False)."""
+    alpha = 2.0 / (EMA_SPAN + 1)
+    return ema + alpha * (close - ema)
+
+def _last_session(now: datetime) -> str:
+    """Última sesión completa antes de hoy (fecha de NY, YYYY-MM-DD)."""
+    d = market_calendar.to_market(now).date() - timedelta(days=1)
+    while not market_calendar.is_trading_day(d):
+        d -= timedelta(days=1)
+    return d.strftime("%Y-%m-%d")
+
+def _fast_quotes(symbols: List[str], now: datetime) -> Dict[str, Tuple[str, float]]:
+    """
+    Último precio en una sola llamada para los símbolos cuya EMA200 guardada ya incluye la
+    última sesión completa; los demás (primera corrida del día, sin estado) van por la ruta diaria.
+    """
+    ema_state = _load_ema_state()
+    floor = _last_session(now)
+    ready = [s for s in symbols if s in ema_state and ema_state[s].get("date", "") >= floor]
+    if not ready:
+        return {}
+    quotes, errors = price_cache.quotes(ready, auto_adjust=USE_ADJ_CLOSE)
+    for sym, err in errors.items():
+        logging.error(f"[{sym}] error de cotización: {err}")
+    return quotes
+
+def _needs_rebuild(entry: Optional[dict], now: datetime) -> bool:
+    if not entry:
+        return True
+    try:
+        last = datetime.strptime(entry["date"], "%Y-%m-%d")
+    except Exception:
+        return True
+    return (now - last).days > EMA_GAP_DAYS
+
+def _last_price_and_ema200(
+    closes: price_cache.CloseArrays, ema_state: dict, rebuild: bool = False
+) -> Tuple[Dict[str, Tuple[float, float]], List[str]]:
+    """
+    Devuelve ({símbolo: (precio_ultimo, ema200_ultimo)}, símbolos_a_reconstruir).
+
+    Con rebuild=False, `closes` solo trae las barras desde la fecha guardada en ema_state
+    y la EMA se actualiza de forma recursiva; si la barra guardada no aparece o su cierre
+    cambió (split/ajuste), el símbolo se regresa en la lista de reconstrucción.
+    Con rebuild=True, `closes` es el histórico completo y se recalcula desde cero.
+    ema_state se actualiza solo con barras completas (anteriores a hoy).
+    """
+    today = price_cache.to_day(_market_today())
+    out: Dict[str, Tuple[float, float]] = {}
+    redo: List[str] = []
+    for row, sym in zip(closes.values, closes.symbols):
+        ok = ~np.isnan(row)  # cada símbolo con sus propias fechas (IPOs, huecos)
+        if not ok.any():
+            continue
+        days = closes.days[ok]
+        values = row[ok].astype(np.float64).tolist()   # la EMA se calcula y se guarda en float64
+
+        if rebuild:
+            ema = values[0]
+            first = 0
+            entry = None
+        else:
+            entry = ema_state.get(sym)
+            pos = int(np.searchsorted(days, price_cache.to_day(entry["date"])))
+            if pos == len(days) or days[pos] != price_cache.to_day(entry["date"]):
+                redo.append(sym)
+                continue
+            if abs(values[pos] - entry["close"]) / entry["close"] * 100.0 > SPLIT_TOLERANCE_PCT:
+                redo.append(sym)
+                continue
+            ema = entry["ema"]
+            first = pos + 1
+
+        for i in range(first, len(values)):
+            ema = values[i] if (rebuild and i == 0) else _ema_step(ema, values[i])
+            if days[i] < today:
+                entry = {"date": price_cache.from_day(days[i]), "close": values[i], "ema": ema}
+        if entry:
+            ema_state[sym] = entry
+        out[sym] = (values[-1], ema)
+    return out, redo
+
+def _load_ema_state() -> dict:
+    state_store.migrate_json(EMA_STATE_NS, EMA_STATE_FILE)
+    return state_store.get_all(EMA_STATE_NS)
+
+def _save_ema_state(ema_state: dict, symbols: List[str]) -> None:
+    """Guarda solo los símbolos que cambiaron."""
+    state_store.put_many(EMA_STATE_NS, {sym: ema_state[sym] for sym in symbols})
+
+def _prices_and_ema200(symbols: List[str], now: datetime,
+                       quotes: Optional[Dict[str, Tuple[str, float]]] = None) -> Dict[str, Tuple[float, float]]:
+    """
+    Precio y EMA200 por símbolo. Con cotización (ver _fast_quotes) la EMA se avanza un paso
+    desde la última barra completa guardada, sin historial; si no, incremental cuando hay
+    estado y reconstrucción completa si no.
+    """
+    ema_state = _load_ema_state()
+    before = {sym: dict(entry) for sym, entry in ema_state.items()}
+    results: Dict[str, Tuple[float, float]] = {}
+
+    for sym, (day, price) in (quotes or {}).items():
+        entry = ema_state.get(sym)
+        if sym not in symbols or not entry:
+            continue
+        if day > entry["date"]:
+            results[sym] = (price, _ema_step(entry["ema"], price))
+        elif day == entry["date"]:
+            results[sym] = (price, entry["ema"])   # antes de la apertura: la barra ya está completa
+    symbols = [s for s in symbols if s not in results]
+
+    incremental = [s for s in symbols if not _needs_rebuild(ema_state.get(s), now)]
+    rebuild = [s for s in symbols if s not in incremental]
+
+    if incremental:
+        start = min(ema_state[s]["date"] for s in incremental)
+        # float64: la EMA y el cierre guardados no deben arrastrar el redondeo de float32
+        for closes in _download_closes(incremental, start=start, dtype=np.float64):
+            res, redo = _last_price_and_ema200(closes, ema_state)
+            results.update(res)
+            # gaps o splits: se recalcula con el histórico completo (ya en caché, sin red)
+            rebuild += redo
+
+    if rebuild:
+        for closes in _download_closes(rebuild, dtype=np.float64):
+            res, _ = _last_price_and_ema200(closes, ema_state, rebuild=True)
+            results.update(res)
+
+    changed = [sym for sym, entry in ema_state.items() if entry != before.get(sym)]
+    if changed:
+        _save_ema_state(ema_state, changed)
+    return results
 
 def _threshold_for(symbol: str) -> float:
     return SYMBOL_THRESHOLDS_PCT.get(symbol.upper(), DEFAULT_THRESHOLD_PCT)
@@ -85,11 +259,9 @@ def _threshold_for(symbol: str) -> float:
 def _format_pct(x: float) -> str:
     return f"{x:.2f}%"
 
-def _maybe_alert(symbol: str) -> bool:
-    """Calcula precio y EMA200; si precio <= EMA200*(1 - thr%), envía alerta y retorna True."""
+def _maybe_alert(symbol: str, price: float, ema200: float) -> bool:
+    """Si precio <= EMA200*(1 - thr%), envía alerta y retorna True."""
     try:
-        hist = _get_hist(symbol)
-        price, ema200 = _last_price_and_ema200(hist)
         thr = _threshold_for(symbol) / 100.0
         trigger_level = ema200 * (1.0 - thr)
 
@@ -113,20 +285,85 @@ def _maybe_alert(symbol: str) -> bool:
         logging.error(f"[{symbol}] error: {e}")
         return False
         
+def _indicator_message(sig: indicators.Signal, snap) -> str:
+    row = snap.loc[sig.symbol]
+    detail = {
+        "rsi_below": f"RSI(14): **{sig.value:.1f}** (umbral {sig.threshold:.1f})",
+        "zscore_below": f"Z-score 20d: **{sig.value:.2f}** (umbral {sig.threshold:.2f})",
+        "drawdown_pct": f"Caída vs máximo 52 sem ({row['high_52w']:.2f}): **{_format_pct(sig.value)}** "
+                        f"(umbral {_format_pct(sig.threshold)})",
+        "death_cross": f"Cruce de la muerte: SMA50 **{row['sma_fast']:.2f}** < SMA200 **{row['sma_slow']:.2f}**",
+        "golden_cross": f"Cruce dorado: SMA50 **{row['sma_fast']:.2f}** > SMA200 **{row['sma_slow']:.2f}**",
+    }[sig.rule]
+    return (
+        f"📊 **Alerta {sig.symbol}** 📊\n"
+        f"Precio: **{row['close']:.2f}**\n"
+        f"{detail}\n"
+        f"Hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    )
+
+def _indicator_rules() -> List[str]:
+    return [r for r in indicators.RULES
+            if INDICATOR_RULES.get(r) is not None
+            or any(r in v for v in SYMBOL_INDICATOR_THRESHOLDS.values())]
+
+def _with_quotes(closes: price_cache.CloseArrays, quotes: Dict[str, Tuple[str, float]]) -> price_cache.CloseArrays:
+    """Bloque de cierres diarios con la barra en curso sustituida (o agregada) por la cotización."""
+    mine = {sym: (price_cache.to_day(day), price) for sym, (day, price) in quotes.items() if sym in closes.symbols}
+    new = np.setdiff1d(np.array(sorted({d for d, _ in mine.values()}), dtype=np.int64), closes.days)
+    if new.size:
+        days = np.union1d(closes.days, new)
+        values = np.full((len(closes.symbols), len(days)), np.nan, dtype=closes.values.dtype)
+        values[:, np.searchsorted(days, closes.days)] = closes.values
+        closes = price_cache.CloseArrays(closes.symbols, days, values)
+    for i, sym in enumerate(closes.symbols):
+        if sym in mine:
+            day, price = mine[sym]
+            closes.values[i, np.searchsorted(closes.days, day)] = price
+    return closes
+
+def _indicator_alerts(now: datetime, state: dict,
+                      quotes: Optional[Dict[str, Tuple[str, float]]] = None) -> List[str]:
+    """Evalúa INDICATOR_RULES para todos los TICKERS y envía las que no estén en cooldown."""
+    rules = _indicator_rules()
+    symbols = [sym for sym in TICKERS if any(_can_send(f"{sym}:{r}", now, state) for r in rules)]
+    if not symbols:
+        return []
+
+    if quotes and all(sym in quotes for sym in symbols):
+        chunks = (_with_quotes(closes, quotes) for closes in _cached_closes(symbols))
+    else:
+        chunks = _download_closes(symbols)
+
+    sent: List[str] = []
+    for closes in chunks:
+        snap = indicators.snapshot_arrays(closes.values, closes.symbols)
+        for sig in indicators.signals(snap, INDICATOR_RULES, SYMBOL_INDICATOR_THRESHOLDS):
+            key = f"{sig.symbol}:{sig.rule}"
+            if not _can_send(key, now, state):
+                continue
+            try:
+                send_discord_message(DISCORD_WEBHOOK_URL_INVESTING, _indicator_message(sig, snap))
+            except Exception as e:
+                logging.error(f"[{sig.symbol}] error: {e}")
+                continue
+            _mark_sent(key, now, state)
+            sent.append(key)
+    return sent
+
 def _load_state() -> dict:
-    try:
-        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
-    except Exception:
-        return {}
+    state_store.migrate_json(STATE_NS, STATE_FILE)
+    return state_store.get_all(STATE_NS)
 
-def _save_state(state: dict) -> None:
-    try:
-        STATE_FILE.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
-    except Exception:
-        pass
+def _save_state(state: dict, symbols: List[str]) -> None:
+    """Guarda en una transacción solo los símbolos marcados; cada uno expira con su cooldown."""
+    with state_store.batch(STATE_NS) as b:
+        for sym in symbols:
+            b.put(sym.upper(), state[sym.upper()], ttl_s=_cooldown_for(sym))
 
 def _cooldown_for(sym: str) -> int:
-    return int(SYMBOL_COOLDOWN_S.get(sym.upper(), COOLDOWN_DEFAULT_S))
+    """Cooldown del símbolo; las llaves "SYM:regla" usan el de SYM."""
+    return int(SYMBOL_COOLDOWN_S.get(sym.split(":")[0].upper(), COOLDOWN_DEFAULT_S))
 
 def _can_send(sym: str, now: datetime, state: dict) -> bool:
     last = state.get(sym.upper())
@@ -142,18 +379,25 @@ def _mark_sent(sym: str, now: datetime, state: dict) -> None:
     state[sym.upper()] = now.isoformat(timespec="seconds")
 
 def main() -> bool:
-    any_sent = False
+    sent: List[str] = []
     state = _load_state()
     now = datetime.now()
 
-    for sym in TICKERS:
-        # respeta cooldown individual
-        if not _can_send(sym, now, state):
-            continue
-        if _maybe_alert(sym):
-            _mark_sent(sym, now, state)
-            any_sent = True
+    # respeta cooldown individual: solo se descargan los símbolos que pueden alertar
+    symbols = [sym for sym in TICKERS if _can_send(sym, now, state)]
+    rules = _indicator_rules()
+    wanted = [sym for sym in TICKERS
+              if sym in symbols or any(_can_send(f"{sym}:{r}", now, state) for r in rules)]
+    quotes = _fast_quotes(wanted, now) if FAST_QUOTES and wanted else {}
+
+    if symbols:
+        for sym, (price, ema200) in _prices_and_ema200(symbols, now, quotes).items():
+            if _maybe_alert(sym, price, ema200):
+                _mark_sent(sym, now, state)
+                sent.append(sym)
+
+    sent += _indicator_alerts(now, state, quotes)
 
-    if any_sent:
-        _save_state(state)
-    return any_sent
+    if sent:
+        _save_state(state, sent)
+    return bool(sent)
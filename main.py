@@ -1,58 +1,433 @@
 # File: main.py
 import importlib
 import asyncio
+import heapq
+import random
+import signal
+import sys
+import threading
 import time
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
+from utilities import job_runner, market_calendar, metrics, profiler, state_store
+
+try:
+    from zoneinfo import ZoneInfo  # Py 3.9+
+except Exception:
+    ZoneInfo = None
 from utilities.sender import send_discord_message, DISCORD_WEBHOOK_URL_DANGERSTACK
 
 # === CONFIGURACIÓN DE SCRIPTS ===
+# Opcionales por script:
+#   "timeout": segundos máximos por ejecución (DEFAULT_TIMEOUT si no se indica)
+#   "overlap": qué hacer si la corrida anterior sigue activa:
+#              "skip" (omitir), "queue" (encolar una) o "cancel" (cancelar la anterior)
+#   "trigger": "interval" (por defecto): cada `interval` segundos
+#              "market": cada `interval` solo con la bolsa de NY abierta, más una corrida
+#                        MARKET_AFTER_CLOSE_S después del cierre
+#              "at":     a horas fijas del reloj, p. ej. "at": ["05:30"], "tz": "America/Tijuana",
+#                        "window": 5 (ancho en minutos de la ventana que tolera el propio módulo)
+#              "module": el módulo expone next_wakeup() -> datetime con su próximo trabajo;
+#                        `interval` queda como espera máxima
+#   "mode":    "thread" (por defecto): hilo del pool compartido
+#              "process": proceso propio del script (no compite por el GIL con el loop; el
+#                         proceso vive entre corridas con sus módulos ya importados)
+#              "inline": en el hilo del loop, solo para scripts triviales (bloquea al scheduler)
+#   "profile": perfilado por muestreo, p. ej. {"sample": 0.1, "slow_s": 20}: guarda el 10% de
+#              las corridas y toda corrida de 20 s o más en data/profiles/ (ver utilities/profiler.py;
+#              también se activa con SMARTHOME_PROFILE=all o una lista de scripts)
 SCRIPTS = {
-    "investment.sp500": {"interval": 3600, "cooldown": 86400},   # cada 1h, cooldown 24h si activa
-    "enviroment.weather": {"interval": 60, "cooldown": 86000},
-    "maintenance.preventive": {"interval": 60, "cooldown": 60},  # cada 60 s, cooldown 60 s
-    "investment.stocks": {"interval": 900, "cooldown": 600} # cada 15 min, cooldown 10 min
+    "investment.sp500": {"interval": 3600, "cooldown": 0, "timeout": 300, "trigger": "market", "mode": "process"},   # cada 1h; cooldown de 24h por índice en sp500.ALERT_COOLDOWN_S
+    "enviroment.weather": {"trigger": "at", "at": ["05:30"], "tz": "America/Tijuana", "window": 5,
+                           "cooldown": 86000, "timeout": 30},  # = NOTIFY_AT / WINDOW_MIN de weather
+    "maintenance.preventive": {"interval": 300, "cooldown": 60, "timeout": 45, "trigger": "module"},  # según recordatorios, máx. 5 min
+    "investment.stocks": {"interval": 300, "cooldown": 600, "timeout": 600, "trigger": "market", "mode": "process"}, # cada 5 min (cotización rápida), cooldown 10 min
 }
 
+DEFAULT_TIMEOUT = 300     # segundos
+DEFAULT_OVERLAP = "skip"
+DEFAULT_MODE = "thread"
+MAX_WORKERS = 4           # hilos máximos ejecutando scripts a la vez
+STARTUP_STAGGER_S = 15    # al arrancar, los scripts ya vencidos salen escalonados cada N s...
+STARTUP_JITTER_S = 5      # ...más un retraso aleatorio de hasta N s
+MARKET_AFTER_CLOSE_S = 900  # trigger "market": corrida única N s después del cierre (barra diaria final)
+MODULE_MIN_WAKE_S = 30      # trigger "module": espera mínima entre corridas
+# Tras arrancar, un hilo de fondo importa las dependencias pesadas y luego los scripts
+# (reporta el costo de cada uno); los imports nunca corren en el hilo del loop.
+# Los scripts en modo "process" se precargan en sus propios procesos, no aquí.
+PREWARM_MODULES = []
+PREWARM_DELAY_S = 5
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="smarthome-job")
+# escrituras de estado (SQLite) fuera del loop; un solo hilo las aplica en orden
+_state_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smarthome-state")
+_process_pools = {}    # nombre -> (ProcessPoolExecutor de 1 proceso, pid del proceso); ver _get_process_pool
+_pools_lock = threading.Lock()   # _process_pools se usa desde el loop y desde el hilo de precarga
+_T0 = time.perf_counter()   # referencia para el tiempo de arranque
+
 # === CONTROL DE TIEMPOS ===
 next_run = {}
 cooldowns = {}
+queue = []  # heap de (vence, nombre, versión); solo vale la última versión de cada script
+_versions = {}
+_wakeup = None  # asyncio.Event: despierta al loop si se encola algo más próximo
+running = {}    # nombre -> asyncio.Task de la corrida activa
+_queued = set() # scripts con una corrida encolada detrás de la activa
+STATE_NS = "scheduler"  # next_run / cooldown por script en utilities.state_store
+
+def _due_time(name):
+    """Próximo vencimiento de un script: el mayor entre next_run y el fin de su cooldown."""
+    due = next_run[name]
+    until = cooldowns.get(name)
+    if until and until > due:
+        due = until
+    return due
+
+def _push(name):
+    """(Re)encola el script con su vencimiento actual; las entradas anteriores quedan obsoletas."""
+    _versions[name] = _versions.get(name, 0) + 1
+    heapq.heappush(queue, (_due_time(name), name, _versions[name]))
+    if _wakeup is not None:
+        _wakeup.set()
+
+def _persist(name, cooldown=False):
+    """
+    Guarda next_run (y el cooldown si se indica) del script: solo sus llaves, en una transacción.
+    Los valores se toman aquí (en el loop) y la escritura corre en _state_executor, sin bloquear al loop.
+    """
+    items = {}
+    if name in next_run:
+        items[f"{name}:next_run"] = (next_run[name].isoformat(), None)
+    if cooldown and name in cooldowns:
+        ttl = max(1.0, (cooldowns[name] - datetime.now()).total_seconds())
+        items[f"{name}:cooldown"] = (cooldowns[name].isoformat(), ttl)
+    if items:
+        _state_executor.submit(_write_state, name, items)
+
+def _write_state(name, items):
+    try:
+        with state_store.batch(STATE_NS) as b:
+            for key, (value, ttl) in items.items():
+                b.put(key, value, ttl_s=ttl)
+    except Exception as e:
+        print(f"⚠️  No se pudo guardar el estado de {name}: {e}")
+
+def _local(dt):
+    """Fecha con tz -> hora local sin tz (como datetime.now())."""
+    return dt.astimezone().replace(tzinfo=None)
+
+def _market_next(now, interval):
+    """Trigger "market": siguiente corrida desde `now` según el calendario de NYSE (local, sin red)."""
+    s = market_calendar.session(market_calendar.to_market(now).date())
+    if s:
+        open_, close = _local(s[0]), _local(s[1])
+        after_close = close + timedelta(seconds=MARKET_AFTER_CLOSE_S)
+        if now < open_:
+            return open_
+        if now < close:
+            nxt = now + timedelta(seconds=interval)
+            return nxt if nxt < close else after_close
+        if now < after_close:
+            return after_close
+    return _local(market_calendar.next_open(now))
+
+def _at_next(config, now, first=False):
+    """
+    Trigger "at": próxima hora del reloj configurada (en su zona horaria).
+    first=True acepta una hora cuya ventana sigue abierta (se corre ya si ya pasó).
+    """
+    tz = ZoneInfo(config["tz"]) if ZoneInfo and config.get("tz") else None
+    half = timedelta(minutes=config.get("window", 0) / 2)
+    times = config["at"] if isinstance(config["at"], (list, tuple)) else [config["at"]]
+    local_now = now.astimezone(tz) if tz else now
+    best = None
+    for days in range(3):
+        d = local_now.date() + timedelta(days=days)
+        for hhmm in times:
+            h, m = (int(x) for x in hhmm.split(":"))
+            target = datetime(d.year, d.month, d.day, h, m, tzinfo=tz)
+            ok = (target + half >= local_now) if first else (target - half > local_now)
+            if ok and (best is None or target < best):
+                best = target
+    if first and best < local_now:
+        return now
+    return _local(best) if tz else best
+
+def _next_after(name, now):
+    """Próxima corrida de un script que se acaba de lanzar en `now`."""
+    config = SCRIPTS[name]
+    trigger = config.get("trigger", "interval")
+    if trigger == "market":
+        return _market_next(now, config["interval"])
+    if trigger == "at":
+        return _at_next(config, now)
+    return now + timedelta(seconds=config["interval"])
+
+def _first_run(name, now):
+    """Primera corrida posible desde `now` (sin historial)."""
+    config = SCRIPTS[name]
+    trigger = config.get("trigger", "interval")
+    if trigger == "market":
+        return _market_next(now, 0)
+    if trigger == "at":
+        return _at_next(config, now, first=True)
+    return now
+
+def _apply_wakeup(name, at):
+    """Trigger "module": adelanta next_run a `at` (lo que regresó module.next_wakeup())."""
+    if at is None:
+        return
+    if at.tzinfo is not None:
+        at = _local(at)
+    at = max(at, datetime.now() + timedelta(seconds=MODULE_MIN_WAKE_S))
+    if at < next_run[name]:
+        next_run[name] = at
+        _persist(name)
+        _push(name)
+
+def _parse_dt(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def _restore(now):
+    """
+    Recupera next_run/cooldowns guardados y escalona los scripts que ya vencieron,
+    para que un reinicio no dispare todo a la vez.
+    """
+    try:
+        saved = state_store.get_all(STATE_NS)
+    except Exception as e:
+        print(f"⚠️  No se pudo leer el estado del scheduler: {e}")
+        saved = {}
+
+    for name, config in SCRIPTS.items():
+        nxt = _parse_dt(saved.get(f"{name}:next_run"))
+        if config.get("trigger") in ("market", "at"):
+            # una corrida vencida fuera de su horario se recorre al siguiente
+            next_run[name] = nxt if nxt and nxt > now else _first_run(name, now)
+        else:
+            # si el intervalo se acortó, no esperar más de un intervalo
+            limit = now + timedelta(seconds=config["interval"])
+            next_run[name] = min(nxt, limit) if nxt else _first_run(name, now)
+        until = _parse_dt(saved.get(f"{name}:cooldown"))
+        if until and until > now:
+            cooldowns[name] = until
+
+    # los más atrasados primero
+    overdue = sorted((n for n in SCRIPTS if _due_time(n) <= now), key=_due_time)
+    for i, name in enumerate(overdue):
+        offset = i * STARTUP_STAGGER_S + random.uniform(0, STARTUP_JITTER_S)
+        next_run[name] = now + timedelta(seconds=offset)
+
+def pending():
+    """Cola de ejecución ordenada [(vence, nombre), ...] para inspección."""
+    return sorted((due, name) for due, name, ver in queue if _versions.get(name) == ver)
+
+def _mode(name):
+    return SCRIPTS[name].get("mode", DEFAULT_MODE)
+
+def _get_process_pool(name):
+    """
+    Proceso de larga vida del script `name` (spawn: no hereda hilos del scheduler), como
+    (pool, pid): cada script en modo "process" tiene el suyo, así matar uno no toca a los demás.
+    El pid lo escribe el propio proceso al arrancar (0 mientras tanto).
+    """
+    with _pools_lock:
+        entry = _process_pools.get(name)
+        if entry is None:
+            ctx = multiprocessing.get_context("spawn")
+            pid = ctx.Value("i", 0, lock=False)
+            pool = ProcessPoolExecutor(max_workers=1, mp_context=ctx,
+                                       initializer=job_runner.init_worker, initargs=([name], pid))
+            entry = _process_pools[name] = (pool, pid)
+        return entry
+
+def _restart_process_pool(name, pool, pid=None):
+    """
+    Descarta el proceso de `name` (si `pool` sigue siendo el actual, se crea otro al siguiente uso).
+    Con pid, lo mata: una corrida que venció su timeout (o se canceló) no se entera y
+    seguiría ocupando el proceso.
+    """
+    with _pools_lock:
+        entry = _process_pools.get(name)
+        if entry is not None and entry[0] is pool:
+            del _process_pools[name]
+    pool.shutdown(wait=False, cancel_futures=True)
+    if pid is not None and pid.value:
+        try:
+            os.kill(pid.value, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except OSError:
+            pass   # ya había terminado
+
+async def _execute(name, profile=None):
+    """Corre el script según su modo; devuelve lo mismo que job_runner.run."""
+    mode = _mode(name)
+    if mode == "inline":
+        return job_runner.run(name, False, profile)
+    if mode == "process":
+        pool, pid = _get_process_pool(name)
+        future = pool.submit(job_runner.run, name, True, profile)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            _restart_process_pool(name, pool)
+            raise
+        except asyncio.CancelledError:
+            # timeout u overlap "cancel": a diferencia de un hilo, el proceso sí se puede matar
+            if not future.done():
+                _restart_process_pool(name, pool, pid)
+            raise
+    if mode == "thread":
+        # el import del script ocurre en el hilo del pool: no bloquea al loop
+        return await asyncio.get_running_loop().run_in_executor(_executor, job_runner.run, name, False, profile)
+    raise ValueError(f"Modo de ejecución desconocido para {name}: {mode}")
+
+def _prewarm():
+    """Hilo de fondo: importa dependencias pesadas y scripts, e imprime cuánto costó cada uno."""
+    time.sleep(PREWARM_DELAY_S)
+    timings = []
+    for name in SCRIPTS:
+        if _mode(name) == "process":
+            _get_process_pool(name)[0].submit(os.getpid)   # levanta su proceso, que precarga el script
+    for mod in PREWARM_MODULES + [n for n in SCRIPTS if _mode(n) != "process"]:
+        if mod in sys.modules:
+            continue
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(mod)
+        except Exception as e:
+            print(f"⚠️  Precarga de {mod} falló: {e}")
+            continue
+        elapsed = time.perf_counter() - t0
+        metrics.observe("startup_import_seconds", elapsed, module=mod)
+        timings.append((mod, elapsed))
+    if timings:
+        report = ", ".join(f"{mod} {elapsed:.2f}s" for mod, elapsed in timings)
+        print(f"⏱️  Precarga de módulos ({sum(t for _, t in timings):.2f}s): {report}")
 
-async def run_script(name):
-    """Ejecuta un script dinámicamente y maneja su cooldown."""
+async def run_script(name, due=None):
+    """Ejecuta un script dinámicamente (con timeout) y maneja su cooldown."""
+    timeout = SCRIPTS[name].get("timeout", DEFAULT_TIMEOUT)
+    if due is not None:
+        metrics.observe("scheduler_lag_seconds", max(0.0, (datetime.now() - due).total_seconds()), script=name)
+    started = time.perf_counter()
+    outcome, result = "ok", None
     try:
-        module = importlib.import_module(name)
         #print(f"[{datetime.now().strftime('%H:%M:%S')}] Ejecutando {name}...")
 
-        # Ejecuta la función principal del módulo
-        result = await asyncio.to_thread(module.main)
+        # Ejecuta la función principal del módulo en el pool acotado.
+        # Nota: un hilo no se puede matar; al vencer el timeout (o al cancelar) se deja de
+        # esperar el resultado, pero el hilo termina por su cuenta. En modo "process" se mata
+        # el proceso del script (los de otros scripts siguen; ver _execute).
+        result, io_s, wake, peak_mb, carry = await asyncio.wait_for(_execute(name, profiler.plan(name, SCRIPTS[name])), timeout)
+        if carry:
+            job_runner.absorb(carry)
+        metrics.observe("scheduler_io_seconds", io_s, script=name)
+        if peak_mb is not None:   # solo en modo "process" (ver job_runner.run)
+            metrics.observe("scheduler_peak_rss_mb", peak_mb, script=name)
 
         # Si el script devuelve True, aplica cooldown
         if result:
             cooldowns[name] = datetime.now() + timedelta(seconds=SCRIPTS[name]["cooldown"])
             print(f"⚠️  {name} activó señal, cooldown hasta {cooldowns[name]}")
+            _persist(name, cooldown=True)
+            _push(name)
 
+        if SCRIPTS[name].get("trigger") == "module":
+            _apply_wakeup(name, wake)
+
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        print(f"⏱️  {name} excedió su timeout de {timeout}s")
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except BrokenProcessPool as e:
+        outcome = "error"
+        metrics.incr("scheduler_exceptions_total", script=name, exception=type(e).__name__)
+        print(f"💥 Murió un proceso ejecutando {name}; se reinicia el pool de procesos")
     except Exception as e:
+        outcome = "error"
+        metrics.incr("scheduler_exceptions_total", script=name, exception=type(e).__name__)
         print(f"❌ Error ejecutando {name}: {e}")
+    finally:
+        metrics.observe("scheduler_run_seconds", time.perf_counter() - started, script=name, outcome=outcome)
+        metrics.incr("scheduler_runs_total", script=name, outcome=outcome,
+                     result="-" if result is None else str(bool(result)).lower())
+
+async def _run_after(name, previous, due=None):
+    """Corrida encolada: espera a que termine la anterior y luego ejecuta."""
+    try:
+        await asyncio.shield(previous)
+    except BaseException:
+        pass
+    _queued.discard(name)
+    await run_script(name, due)
+
+def dispatch(name, due=None):
+    """Lanza el script como tarea independiente aplicando su política de solapamiento."""
+    previous = running.get(name)
+    if previous is not None and not previous.done():
+        policy = SCRIPTS[name].get("overlap", DEFAULT_OVERLAP)
+        if policy == "skip":
+            print(f"⏭️  {name} sigue en ejecución, se omite esta corrida")
+            metrics.incr("scheduler_runs_total", script=name, outcome="skipped", result="-")
+            return
+        if policy == "queue":
+            if name in _queued:
+                return
+            _queued.add(name)
+            task = asyncio.create_task(_run_after(name, previous, due))
+        elif policy == "cancel":
+            previous.cancel()
+            print(f"🛑 {name} cancelado por una corrida nueva")
+            task = asyncio.create_task(run_script(name, due))
+        else:
+            raise ValueError(f"Política de solapamiento desconocida para {name}: {policy}")
+    else:
+        task = asyncio.create_task(run_script(name, due))
+
+    running[name] = task
+    task.add_done_callback(lambda t, n=name: running.pop(n, None) if running.get(n) is t else None)
 
 async def scheduler():
-    """Loop infinito que ejecuta scripts según sus intervalos y cooldowns."""
+    """Loop infinito: duerme exactamente hasta el próximo vencimiento de la cola y lanza ese script."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    _restore(datetime.now())
     for name in SCRIPTS:
-        next_run[name] = datetime.now()
+        _push(name)
+    print(f"✅ Scheduler listo en {time.perf_counter() - _T0:.2f}s")
+    threading.Thread(target=_prewarm, name="prewarm", daemon=True).start()
 
     while True:
-        now = datetime.now()
+        due, name, ver = queue[0]
+        # Entrada obsoleta: el script se volvió a encolar (cooldown, next_wakeup, ...)
+        if _versions.get(name) != ver:
+            heapq.heappop(queue)
+            continue
 
-        for name, config in SCRIPTS.items():
-            # Revisar si está en cooldown
-            if name in cooldowns and cooldowns[name] > now:
-                continue
+        delay = (due - datetime.now()).total_seconds()
+        if delay > 0:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            continue
 
-            # Revisar si ya toca ejecutar
-            if now >= next_run[name]:
-                await run_script(name)
-                next_run[name] = now + timedelta(seconds=config["interval"])
+        heapq.heappop(queue)
 
-        await asyncio.sleep(10)  # espera pequeña entre iteraciones
+        now = datetime.now()
+        dispatch(name, due)
+        next_run[name] = _next_after(name, now)
+        _persist(name)
+        _push(name)
 
 if __name__ == "__main__":
     from datetime import datetime
@@ -71,4 +446,12 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"⚠️  No se pudo notificar arranque: {e}")
 
+    # Métricas locales: http://127.0.0.1:9464/metrics (Prometheus) y /metrics.json
+    try:
+        metrics.serve()
+    except OSError as e:
+        print(f"⚠️  No se pudo abrir el endpoint de métricas: {e}")
+
+    # systemd detiene con SIGTERM: salir limpio para que atexit vacíe la cola de Discord
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     asyncio.run(scheduler())
\ No newline at end of file
@@ -1,17 +1,18 @@
 #https://docs.google.com/spreadsheets/d/e/2PACX-1vSTpapmVlF-Y6AhJu0k-sKCkO0w4RkMo01rajGq5IcicbL0p-Ih0B99Iu4Wr6biX5YEngI6v2sqYKqp/pub?gid=0&single=true&output=csv
 # home/reminders.py
 from __future__ import annotations
-import csv, io, json, logging, calendar
+import csv, io, json, logging, calendar, hashlib, heapq, time
+from dataclasses import dataclass
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional
-import requests
 
 try:
     from zoneinfo import ZoneInfo  # Py 3.9+
 except Exception:
     ZoneInfo = None
 
+from utilities import http_client, state_store
 from utilities.sender import send_discord_message, DISCORD_WEBHOOK_URL_REMINDER
 
 # =============== CONFIG ===============
@@ -19,7 +20,12 @@ TIMEZONE = "America/Tijuana"
 SHEET_CSV_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSTpapmVlF-Y6AhJu0k-sKCkO0w4RkMo01rajGq5IcicbL0p-Ih0B99Iu4Wr6biX5YEngI6v2sqYKqp/pub?gid=0&single=true&output=csv"  # pega aquí tu enlace .../pub?output=csv
 LOCAL_CSV_PATH = "" # opcional, CSV local
 WINDOW_MIN = 20      # ventana ±10 min alrededor de la hora objetivo
+# Estado en utilities.state_store (el JSON heredado se importa una vez)
+STATE_NS = "reminders.sent"          # {"actividad|fecha|hh:mm": envío ISO}
+STATE_TTL_S = 3 * 365 * 86400        # cada envío se recuerda 3 años (cubre el catch-up más largo)
 STATE_FILE = Path(__file__).with_name(".reminders_state.json")
+SHEET_NS = "reminders.sheet"         # última copia de la hoja (cuerpo + ETag/Last-Modified)
+SHEET_MIN_REFRESH_S = 300   # no se vuelve a consultar la hoja antes de N segundos
 # Catch-up de vencidos (para MONTH con FECHA como fecha completa)
 CATCH_UP_OVERDUE = True      # True: avisa inmediato si detecta atraso
 CATCH_UP_MAX_DAYS = None     # None = sin límite; o pon un entero (p. ej. 30) para avisar si el atraso ≤ 30 días
@@ -35,17 +41,69 @@ FALLBACK_ROWS = [
 ]
 # ======================================
 
+_sheet: Optional[Dict[str, object]] = None   # caché en memoria de la hoja (ver _fetch_sheet)
+
 def _now_local() -> datetime:
     return datetime.now(ZoneInfo(TIMEZONE)) if ZoneInfo else datetime.now()
 
-def _load_rows() -> List[Dict[str,str]]:
-    if SHEET_CSV_URL:
+def _read_sheet_cache() -> Dict[str, object]:
+    """Última copia de la hoja (cuerpo + validadores ETag/Last-Modified), leída del state store una vez."""
+    global _sheet
+    if _sheet is None:
+        _sheet = {"body": None, "etag": None, "last_modified": None, "rows": None, "checked_at": 0.0}
         try:
-            r = requests.get(SHEET_CSV_URL, timeout=10)
-            r.raise_for_status()
-            return list(csv.DictReader(io.StringIO(r.text)))
+            data = state_store.get(SHEET_NS, "csv") or {}
+            _sheet.update({k: data.get(k) for k in ("body", "etag", "last_modified")})
+            if _sheet["body"] is not None:
+                _sheet["rows"] = list(csv.DictReader(io.StringIO(_sheet["body"])))
         except Exception as e:
-            logging.error(f"Google CSV error: {e}")
+            logging.error(f"Caché de la hoja ilegible: {e}")
+    return _sheet
+
+def _write_sheet_cache(cache: Dict[str, object]) -> None:
+    try:
+        state_store.put(SHEET_NS, "csv", {k: cache[k] for k in ("body", "etag", "last_modified")})
+    except Exception as e:
+        logging.error(f"No se pudo guardar la caché de la hoja: {e}")
+
+def _fetch_sheet() -> Optional[List[Dict[str,str]]]:
+    """
+    Descarga condicional de la hoja: como máximo una vez cada SHEET_MIN_REFRESH_S; con
+    304 (o cuerpo idéntico) regresa la MISMA lista de filas, así el índice no se recompila.
+    Sin red, regresa la última copia guardada.
+    """
+    cache = _read_sheet_cache()
+    now = time.time()
+    if cache["rows"] is not None and now - cache["checked_at"] < SHEET_MIN_REFRESH_S:
+        return cache["rows"]
+    cache["checked_at"] = now
+
+    headers = {}
+    if cache["rows"] is not None:
+        if cache["etag"]:
+            headers["If-None-Match"] = cache["etag"]
+        if cache["last_modified"]:
+            headers["If-Modified-Since"] = cache["last_modified"]
+    try:
+        r = http_client.get(SHEET_CSV_URL, headers=headers, timeout=10)
+        if r.status_code == 304 and cache["rows"] is not None:
+            return cache["rows"]
+        r.raise_for_status()
+        cache["etag"] = r.headers.get("ETag")
+        cache["last_modified"] = r.headers.get("Last-Modified")
+        if r.text != cache["body"]:
+            cache["body"] = r.text
+            cache["rows"] = list(csv.DictReader(io.StringIO(r.text)))
+        _write_sheet_cache(cache)
+    except Exception as e:
+        logging.error(f"Google CSV error: {e}")
+    return cache["rows"]
+
+def _load_rows() -> List[Dict[str,str]]:
+    if SHEET_CSV_URL:
+        rows = _fetch_sheet()
+        if rows is not None:
+            return rows
     if LOCAL_CSV_PATH:
         try:
             with open(LOCAL_CSV_PATH, "r", encoding="utf-8", newline="") as f:
@@ -97,16 +155,12 @@ def _dt_with_time(d: datetime, hh: int, mm: int) -> datetime:
     """Devuelve 'd' con la hora hh:mm, conservando tzinfo."""
     return d.replace(hour=hh, minute=mm, second=0, microsecond=0)
 
-def _load_state() -> Dict[str,str]:
-    try: return json.loads(STATE_FILE.read_text(encoding="utf-8"))
-    except Exception: return {}
+def _already_sent(key: str) -> bool:
+    return state_store.get(STATE_NS, key) is not None
 
 def _save_state(st: Dict[str,str]) -> None:
-    if len(st) > 1000:
-        keys = list(st.keys())[-500:]
-        st = {k: st[k] for k in keys}
-    try: STATE_FILE.write_text(json.dumps(st, ensure_ascii=False), encoding="utf-8")
-    except Exception: pass
+    """Guarda solo los envíos nuevos (en una transacción); los viejos expiran por TTL."""
+    state_store.put_many(STATE_NS, st, ttl_s=STATE_TTL_S)
 
 def _sent_key(activity:str, date_key:str, hh:int, mm:int) -> str:
     return f"{activity}|{date_key}|{hh:02d}:{mm:02d}"
@@ -114,140 +168,195 @@ def _sent_key(activity:str, date_key:str, hh:int, mm:int) -> str:
 def _today_key(now: datetime) -> str:
     return now.strftime("%Y-%m-%d")
 
-# -------- Reglas --------
-def _is_day_due(row, now, hh, mm) -> bool:
-    freq = max(1, _parse_int(row.get("FRECUENCIA","1")) or 1)
-    if freq == 1:
-        return _within_window(now, hh, mm)
-    base = _parse_date_any(row.get("FECHA",""))
-    if not base: return False
-    days = (now.date() - base.date()).days
-    return days >= 0 and (days % freq == 0) and _within_window(now, hh, mm)
-
-def _is_week_due(row, now, hh, mm) -> bool:
-    # FECHA = 1..7 (1=Lun .. 7=Dom)
-    dow = _parse_int(row.get("FECHA",""))
-    if dow is None or not (1 <= dow <= 7): return False
-    mon1 = now.weekday() + 1
-    if mon1 != dow or not _within_window(now, hh, mm): return False
-    freq = max(1, _parse_int(row.get("FRECUENCIA","1")) or 1)
-    if freq == 1: return True
-    base = _parse_date_any(row.get("FECHA_BASE","")) or _parse_date_any(row.get("START",""))
-    if base:
-        weeks = (now.date() - base.date()).days // 7
-        return weeks >= 0 and (weeks % freq == 0)
-    return True  # sin base, acepta el match de día/hora
-
-def _is_month_due(row, now: datetime, hh: int, mm: int):
-    """
-    MONTH:
-      - FECHA con barra/guión => tratar como FECHA BASE completa (d/m/Y, d/m/y, Y-m-d).
-        Dispara en base + k*FRECUENCIA meses. Si CATCH_UP_OVERDUE=True y ya pasó, envía una vez
-        por la última vencida (luego se reengancha al próximo múltiplo).
-      - FECHA numérica (1..31) y FRECUENCIA=1 => mensual simple en ese día exacto.
-    Retorna (due: bool, due_dt: datetime|None, base_str: str|None, freq: int|None)
-    """
-    freq = max(1, _parse_int(row.get("FRECUENCIA", "1")) or 1)
-    fecha_raw = (row.get("FECHA") or "").strip()
+# -------- Reglas compiladas --------
+# Cada fila del CSV se compila una sola vez en un _Rule con su próxima ocurrencia
+# precalculada; las ocurrencias pendientes viven en un heap ordenado por inicio de ventana.
+_DAY = timedelta(days=1)
+
+@dataclass
+class _Rule:
+    actividad: str
+    unidad: str                        # DAY | WEEK | MONTH | YEAR
+    hh: int
+    mm: int
+    freq: int
+    fecha_raw: str
+    base: Optional[date] = None        # DAY/MONTH/YEAR: FECHA; WEEK: FECHA_BASE/START
+    dow: Optional[int] = None          # WEEK: 1=Lun .. 7=Dom
+    day_cfg: Optional[int] = None      # MONTH mensual simple: día del mes
+
+    def occurrence_on_or_after(self, d: date) -> Optional[date]:
+        """Primera fecha >= d en la que toca la actividad (None si nunca)."""
+        if self.unidad == "DAY":
+            if self.freq == 1:
+                return d
+            if self.base is None:
+                return None
+            if d < self.base:
+                return self.base
+            return d + timedelta(days=(-(d - self.base).days) % self.freq)
+
+        if self.unidad == "WEEK":
+            c = d + timedelta(days=(self.dow - 1 - d.weekday()) % 7)
+            if self.freq == 1 or self.base is None:
+                return c
+            if c < self.base:
+                c += timedelta(days=7 * -(-(self.base - c).days // 7))
+            while ((c - self.base).days // 7) % self.freq != 0:
+                c += timedelta(days=7)
+            return c
+
+        if self.unidad == "MONTH":
+            if self.base is not None:
+                # base + k*freq meses, k >= 1
+                months = (d.year - self.base.year) * 12 + (d.month - self.base.month)
+                k = max(1, months // self.freq)
+                while _add_months_keep_dom(self.base, k * self.freq) < d:
+                    k += 1
+                while k > 1 and _add_months_keep_dom(self.base, (k - 1) * self.freq) >= d:
+                    k -= 1
+                return _add_months_keep_dom(self.base, k * self.freq)
+            if self.day_cfg is None or self.freq != 1:
+                # Para día del mes sin base solo permitimos mensual simple (freq=1)
+                return None
+            y, m = d.year, d.month
+            while True:
+                c = date(y, m, min(max(1, self.day_cfg), _last_dom(y, m)))
+                if c >= d:
+                    return c
+                y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+        if self.unidad == "YEAR":
+            if self.base is None:
+                return None
+            y = max(d.year, self.base.year + self.freq)
+            for y in range(y, y + 9):  # 29/feb solo existe en bisiestos
+                try:
+                    c = date(y, self.base.month, self.base.day)
+                except ValueError:
+                    continue
+                if c >= d:
+                    return c
+            return None
 
-    # ¿Fecha base completa?
-    is_full_date = ("/" in fecha_raw) or ("-" in fecha_raw)
-    base = _parse_date_any(fecha_raw) if is_full_date else None
-
-    if base:
-        # ---- Caso FECHA BASE ----
-        first_due = _add_months_keep_dom(base, freq)
-        first_due_dt = _dt_with_time(first_due, hh, mm)
-        if now < first_due_dt:
-            return (False, None, None, None)
-
-        months_since = (now.year - base.year) * 12 + (now.month - base.month)
-        k = max(1, months_since // freq)
-
-        last_due = _add_months_keep_dom(base, k * freq)
-        last_due_dt = _dt_with_time(last_due, hh, mm)
-
-        # Si quedó “por delante”, retrocede un múltiplo
-        if last_due_dt > now and k >= 1:
-            k -= 1
-            last_due = _add_months_keep_dom(base, k * freq)
-            last_due_dt = _dt_with_time(last_due, hh, mm)
-
-        # a) On-time: hoy es la fecha/hora exacta
-        if _within_window(now, hh, mm) and now.date() == last_due_dt.date():
-            return (True, last_due_dt, fecha_raw, freq)
-
-        # b) Catch-up: la última vencida es <= now (enviar una vez)
-        if CATCH_UP_OVERDUE and last_due_dt <= now:
-            if CATCH_UP_MAX_DAYS is None:
-                return (True, last_due_dt, fecha_raw, freq)
-            overdue_days = (now - last_due_dt).total_seconds() / 86400.0
-            if overdue_days <= float(CATCH_UP_MAX_DAYS):
-                return (True, last_due_dt, fecha_raw, freq)
-
-        return (False, None, None, None)
-
-    # ---- Caso día del mes (mensual simple) ----
-    day_cfg = _parse_int(fecha_raw)
-    if day_cfg is None:
-        return (False, None, None, None)
-    if freq != 1:
-        # Para día del mes sin base solo permitimos mensual simple (freq=1)
-        return (False, None, None, None)
-
-    last_dom = _last_dom(now.year, now.month)
-    target_day = min(max(1, day_cfg), last_dom)
-    if now.day != target_day:
-        return (False, None, None, None)
-    if not _within_window(now, hh, mm):
-        return (False, None, None, None)
-    return (True, _dt_with_time(now, hh, mm), None, None)
-
-
-def _is_year_due(row, now, hh, mm) -> bool:
-    base = _parse_date_any(row.get("FECHA",""))
-    if not base: return False
-    if (now.month, now.day) != (base.month, base.day): return False
-    freq = max(1, _parse_int(row.get("FRECUENCIA","1")) or 1)
-    if now.year < base.year + freq: return False
-    return _within_window(now, hh, mm)
+        return None
+
+    def at(self, d: date, tz) -> datetime:
+        return datetime(d.year, d.month, d.day, self.hh, self.mm, tzinfo=tz)
+
+    def window(self, occ: date, tz) -> tuple[datetime, datetime]:
+        """(inicio, fin) en que la ocurrencia se puede avisar."""
+        target = self.at(occ, tz)
+        if self.unidad == "MONTH" and self.base is not None:
+            # FECHA BASE: nunca antes de la hora; con catch-up, hasta la siguiente ocurrencia
+            if not CATCH_UP_OVERDUE:
+                return target, target + timedelta(minutes=WINDOW_MIN / 2)
+            nxt = self.occurrence_on_or_after(occ + _DAY)
+            end = self.at(nxt, tz) - timedelta(microseconds=1) if nxt else datetime.max.replace(tzinfo=tz)
+            if CATCH_UP_MAX_DAYS is not None:
+                end = min(end, target + timedelta(days=float(CATCH_UP_MAX_DAYS)))
+            return target, end
+        half = timedelta(minutes=WINDOW_MIN / 2)
+        day_start = datetime(occ.year, occ.month, occ.day, tzinfo=tz)
+        day_end = day_start + _DAY - timedelta(microseconds=1)
+        return max(target - half, day_start), min(target + half, day_end)
+
+    def first_pending(self, now: datetime) -> Optional[date]:
+        """Ocurrencia cuya ventana aún no termina (la que se debe vigilar a partir de now)."""
+        tz = now.tzinfo
+        today = now.date()
+        if self.unidad == "MONTH" and self.base is not None:
+            # la última vencida puede seguir en catch-up aunque sea de meses atrás
+            occ = self.occurrence_on_or_after(_add_months_keep_dom(self.base, self.freq))
+            while True:
+                nxt = self.occurrence_on_or_after(occ + _DAY)
+                if nxt is None or self.at(nxt, tz) > now:
+                    break
+                occ = nxt
+        else:
+            occ = self.occurrence_on_or_after(today)
+        while occ is not None and self.window(occ, tz)[1] < now:
+            occ = self.occurrence_on_or_after(occ + _DAY)
+        return occ
 
 def _normalize_unit(s: str) -> str:
     s = (s or "").strip().upper()
     return s
 
-def _due_for_row(row: Dict[str, str], now: datetime) -> Optional[Dict[str, str]]:
+def _compile_row(row: Dict[str, str]) -> Optional[_Rule]:
     actividad = (row.get("ACTIVIDAD") or "").strip()
-    unidad = (row.get("UNIDAD") or "").strip().upper()
+    unidad = _normalize_unit(row.get("UNIDAD"))
     hhmm = _parse_hhmm(row.get("HORA", ""))
-    if not actividad or not unidad or not hhmm:
+    if not actividad or unidad not in ("DAY", "WEEK", "MONTH", "YEAR") or not hhmm:
         return None
     hh, mm = hhmm
-
-    if unidad == "DAY" and _is_day_due(row, now, hh, mm):
-        return {"actividad": actividad, "hh": hh, "mm": mm, "unidad": "DAY", "date_key": now.strftime("%Y-%m-%d")}
-
-    if unidad == "WEEK" and _is_week_due(row, now, hh, mm):
-        return {"actividad": actividad, "hh": hh, "mm": mm, "unidad": "WEEK", "date_key": now.strftime("%Y-%m-%d")}
-
-    if unidad == "MONTH":
-        due, due_dt, base_str, freq = _is_month_due(row, now, hh, mm)
-        if due:
-            return {
-                "actividad": actividad,
-                "hh": hh, "mm": mm, "unidad": "MONTH",
-                # usamos la fecha real de vencimiento (on-time o catch-up) para el control de reenvío
-                "date_key": (due_dt.strftime("%Y-%m-%d") if due_dt else now.strftime("%Y-%m-%d")),
-                # extras para el mensaje (solo si hay base)
-                "base_str": base_str,
-                "freq": freq,
-            }
-        return None
-
-    if unidad == "YEAR" and _is_year_due(row, now, hh, mm):
-        return {"actividad": actividad, "hh": hh, "mm": mm, "unidad": "YEAR", "date_key": now.strftime("%Y-%m-%d")}
-
-    return None
+    freq = max(1, _parse_int(row.get("FRECUENCIA", "1")) or 1)
+    fecha_raw = (row.get("FECHA") or "").strip()
+    rule = _Rule(actividad, unidad, hh, mm, freq, fecha_raw)
+
+    if unidad == "DAY" or unidad == "YEAR":
+        base = _parse_date_any(fecha_raw)
+        rule.base = base.date() if base else None
+    elif unidad == "WEEK":
+        rule.dow = _parse_int(fecha_raw)
+        if rule.dow is None or not (1 <= rule.dow <= 7):
+            return None
+        base = _parse_date_any(row.get("FECHA_BASE", "")) or _parse_date_any(row.get("START", ""))
+        rule.base = base.date() if base else None
+    else:
+        # FECHA con barra/guión => FECHA BASE completa; si no, día del mes
+        if ("/" in fecha_raw) or ("-" in fecha_raw):
+            base = _parse_date_any(fecha_raw)
+            rule.base = base.date() if base else None
+        else:
+            rule.day_cfg = _parse_int(fecha_raw)
+    return rule
+
+# Índice compilado (vive mientras el módulo esté cargado por el scheduler)
+_rules: List[_Rule] = []
+_index: List[tuple] = []     # heap de (inicio_ventana, n, idx_regla, fecha_ocurrencia)
+_rows_sig: Optional[str] = None
+_rows_ref: Optional[list] = None
+_seq = 0
+
+def _schedule(idx: int, occ: Optional[date], tz) -> None:
+    global _seq
+    if occ is None:
+        return
+    _seq += 1
+    heapq.heappush(_index, (_rules[idx].window(occ, tz)[0], _seq, idx, occ))
+
+def _compile(rows: List[Dict[str, str]], now: datetime) -> None:
+    """Recompila las reglas solo si el contenido de la hoja cambió."""
+    global _rules, _index, _rows_sig, _rows_ref
+    if rows is _rows_ref:
+        return
+    sig = hashlib.sha1(json.dumps(rows, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    _rows_ref = rows
+    if sig == _rows_sig:
+        return
+    _rows_sig = sig
+    _rules = [r for r in (_compile_row(row) for row in rows) if r is not None]
+    _index = []
+    for i, rule in enumerate(_rules):
+        _schedule(i, rule.first_pending(now), now.tzinfo)
+
+def _due_now(now: datetime) -> List[tuple[int, date]]:
+    """Saca del índice las ocurrencias cuya ventana ya inició; regresa (idx_regla, fecha) de las vigentes."""
+    due = []
+    tz = now.tzinfo
+    while _index and _index[0][0] <= now:
+        _, n, idx, occ = heapq.heappop(_index)
+        rule = _rules[idx]
+        if rule.window(occ, tz)[1] >= now:
+            due.append((idx, occ))
+        if n:  # n == 0: reintento de un envío fallido, la siguiente ya está en el índice
+            _schedule(idx, rule.occurrence_on_or_after(occ + _DAY), tz)
+    return due
+
+def next_wakeup() -> Optional[datetime]:
+    """Inicio de la próxima ventana de aviso (para el trigger "module" del scheduler)."""
+    return _index[0][0] if _index else None
 
 def _send(activity: str, now: datetime, hh: int, mm: int, *, base_str: str | None = None, unit: str | None = None, freq: int | None = None) -> None:
     hora_txt = f"{hh:02d}:{mm:02d}"
@@ -267,31 +376,35 @@ def _send(activity: str, now: datetime, hh: int, mm: int, *, base_str: str | Non
 def main() -> bool:
     now = _now_local()
     rows = _load_rows()
-    state = _load_state()
-    sent = False
+    _compile(rows, now)
+    due = _due_now(now)
+    if not due:
+        return False
 
-    for row in rows:
-        due = _due_for_row(row, now)
-        if not due:
-            continue
-
-        date_key = due.get("date_key") or now.strftime("%Y-%m-%d")
-        key = _sent_key(due["actividad"], date_key, due["hh"], due["mm"])
-        if key in state:
+    state_store.migrate_json(STATE_NS, STATE_FILE, ttl_s=STATE_TTL_S)   # una vez por corrida, no por llave
+    state: Dict[str, str] = {}
+    sent = False
+    for idx, occ in due:
+        rule = _rules[idx]
+        key = _sent_key(rule.actividad, occ.strftime("%Y-%m-%d"), rule.hh, rule.mm)
+        if key in state or _already_sent(key):
             continue
 
+        with_base = rule.unidad == "MONTH" and rule.base is not None
         try:
             _send(
-                due["actividad"], now, due["hh"], due["mm"],
-                base_str=due.get("base_str"),
-                unit=due.get("unidad"),
-                freq=due.get("freq"),
+                rule.actividad, now, rule.hh, rule.mm,
+                base_str=rule.fecha_raw if with_base else None,
+                unit=rule.unidad,
+                freq=rule.freq if with_base else None,
             )
             state[key] = now.isoformat(timespec="seconds")
             sent = True
             # time.sleep(0.4)  # opcional: anti 429 si hay muchas
         except Exception as e:
-            logging.error(f"Error enviando '{due['actividad']}': {e}")
+            logging.error(f"Error enviando '{rule.actividad}': {e}")
+            # se vuelve a intentar en el siguiente tick mientras siga en ventana
+            heapq.heappush(_index, (now, 0, idx, occ))
 
     if sent:
         _save_state(state)
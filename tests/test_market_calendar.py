@@ -0,0 +1,80 @@
+# File: tests/test_market_calendar.py
+"""Calendario de NYSE con fechas fijas (feriados y cierres anticipados publicados por NYSE)."""
+from datetime import date, datetime, timezone
+
+import pytest
+
+from utilities import market_calendar as mc
+
+NY = mc._tz()
+
+def ny(*args) -> datetime:
+    return datetime(*args, tzinfo=NY)
+
+@pytest.mark.parametrize("d", [
+    date(2026, 1, 1),     # Año Nuevo
+    date(2026, 1, 19),    # Martin Luther King Jr.
+    date(2026, 2, 16),    # Presidents' Day
+    date(2026, 4, 3),     # Good Friday (Pascua el 5/abr)
+    date(2026, 5, 25),    # Memorial Day
+    date(2026, 6, 19),    # Juneteenth
+    date(2026, 7, 3),     # Independence Day (4/jul en sábado -> viernes)
+    date(2026, 9, 7),     # Labor Day
+    date(2026, 11, 26),   # Thanksgiving
+    date(2026, 12, 25),   # Navidad
+    date(2024, 3, 29),    # Good Friday 2024
+    date(2022, 12, 26),   # Navidad en domingo -> lunes
+])
+def test_holidays(d):
+    assert d in mc.holidays(d.year)
+    assert not mc.is_trading_day(d)
+    assert mc.session(d) is None
+
+def test_new_year_on_saturday_is_not_observed():
+    # 1/ene/2022 fue sábado: NYSE abrió el viernes 31/dic/2021
+    assert date(2021, 12, 31) not in mc.holidays(2021)
+    assert date(2021, 12, 31) not in mc.holidays(2022)
+    assert mc.is_trading_day(date(2021, 12, 31))
+
+def test_juneteenth_only_from_2022():
+    assert date(2021, 6, 18) not in mc.holidays(2021)
+    assert date(2022, 6, 20) in mc.holidays(2022)
+
+def test_weekend_has_no_session():
+    assert mc.session(date(2026, 10, 17)) is None   # sábado
+    assert mc.session(date(2026, 10, 18)) is None   # domingo
+
+def test_regular_session():
+    assert mc.session(date(2026, 10, 19)) == (ny(2026, 10, 19, 9, 30), ny(2026, 10, 19, 16, 0))
+
+@pytest.mark.parametrize("d", [
+    date(2026, 11, 27),   # viernes después de Thanksgiving
+    date(2026, 12, 24),   # Nochebuena
+    date(2025, 7, 3),     # víspera del 4/jul (viernes)
+])
+def test_early_close(d):
+    assert mc.session(d) == (ny(d.year, d.month, d.day, 9, 30), ny(d.year, d.month, d.day, 13, 0))
+
+def test_is_open_uses_early_close():
+    assert mc.is_open(ny(2026, 11, 27, 12, 59))
+    assert not mc.is_open(ny(2026, 11, 27, 13, 0))
+    assert not mc.is_open(ny(2026, 10, 19, 9, 29))
+
+def test_to_market_converts_aware_times():
+    # 14:30 UTC en horario de verano = 10:30 en NY
+    assert mc.to_market(datetime(2026, 7, 1, 14, 30, tzinfo=timezone.utc)) == ny(2026, 7, 1, 10, 30)
+
+def test_next_open_skips_holiday_and_is_strict():
+    # miércoles antes de Thanksgiving, tras el cierre -> viernes 27
+    assert mc.next_open(ny(2026, 11, 25, 17, 0)) == ny(2026, 11, 27, 9, 30)
+    # justo en la apertura: la siguiente es la del día hábil siguiente
+    assert mc.next_open(ny(2026, 10, 19, 9, 30)) == ny(2026, 10, 20, 9, 30)
+    # viernes tras el cierre -> lunes
+    assert mc.next_open(ny(2026, 10, 16, 16, 0)) == ny(2026, 10, 19, 9, 30)
+
+def test_last_close():
+    # durante la sesión anticipada aún no cierra: el último cierre es el del miércoles
+    assert mc.last_close(ny(2026, 11, 27, 12, 0)) == ny(2026, 11, 25, 16, 0)
+    assert mc.last_close(ny(2026, 11, 27, 13, 0)) == ny(2026, 11, 27, 13, 0)
+    # lunes antes de abrir -> cierre anticipado del viernes
+    assert mc.last_close(ny(2026, 11, 30, 8, 0)) == ny(2026, 11, 27, 13, 0)
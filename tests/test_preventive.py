@@ -0,0 +1,99 @@
+# File: tests/test_preventive.py
+"""Reglas compiladas de maintenance.preventive: ocurrencias y próxima ventana con fechas fijas."""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from maintenance import preventive as pv
+
+TZ = pv.ZoneInfo(pv.TIMEZONE)
+
+def rule(unidad, fecha, freq=1, hora="0900", **extra):
+    row = {"ACTIVIDAD": f"{unidad} {fecha}", "FRECUENCIA": str(freq), "UNIDAD": unidad,
+           "FECHA": fecha, "HORA": hora, **extra}
+    compiled = pv._compile_row(row)
+    assert compiled is not None
+    return compiled
+
+@pytest.fixture
+def index(monkeypatch):
+    """Índice vacío para cada prueba (el módulo lo guarda en globales)."""
+    monkeypatch.setattr(pv, "_rules", [])
+    monkeypatch.setattr(pv, "_index", [])
+    monkeypatch.setattr(pv, "_rows_sig", None)
+    monkeypatch.setattr(pv, "_rows_ref", None)
+    monkeypatch.setattr(pv, "CATCH_UP_OVERDUE", True)
+    monkeypatch.setattr(pv, "CATCH_UP_MAX_DAYS", None)
+
+def test_day_every_n_days_from_base():
+    r = rule("DAY", "01/10/2026", freq=3)
+    assert r.occurrence_on_or_after(date(2026, 9, 1)) == date(2026, 10, 1)
+    assert r.occurrence_on_or_after(date(2026, 10, 1)) == date(2026, 10, 1)
+    assert r.occurrence_on_or_after(date(2026, 10, 2)) == date(2026, 10, 4)
+    assert r.occurrence_on_or_after(date(2026, 10, 19)) == date(2026, 10, 19)
+
+def test_week_day_of_week():
+    r = rule("WEEK", "3")                                     # miércoles
+    assert r.occurrence_on_or_after(date(2026, 10, 19)) == date(2026, 10, 21)
+    assert r.occurrence_on_or_after(date(2026, 10, 21)) == date(2026, 10, 21)
+    assert r.occurrence_on_or_after(date(2026, 10, 22)) == date(2026, 10, 28)
+
+def test_week_every_two_weeks_from_base():
+    r = rule("WEEK", "1", freq=2, FECHA_BASE="05/10/2026")   # lunes alternos desde el 5/oct
+    assert r.occurrence_on_or_after(date(2026, 10, 1)) == date(2026, 10, 5)
+    assert r.occurrence_on_or_after(date(2026, 10, 6)) == date(2026, 10, 19)
+    assert r.occurrence_on_or_after(date(2026, 10, 20)) == date(2026, 11, 2)
+
+def test_month_day_is_capped_to_month_end():
+    r = rule("MONTH", "31")
+    assert r.occurrence_on_or_after(date(2026, 2, 1)) == date(2026, 2, 28)
+    assert r.occurrence_on_or_after(date(2026, 3, 1)) == date(2026, 3, 31)
+    assert r.occurrence_on_or_after(date(2026, 4, 1)) == date(2026, 4, 30)
+
+def test_month_from_base_keeps_day_of_month():
+    r = rule("MONTH", "31/01/2026", freq=1)
+    assert r.occurrence_on_or_after(date(2026, 1, 1)) == date(2026, 2, 28)   # k >= 1: nunca la base
+    assert r.occurrence_on_or_after(date(2026, 3, 1)) == date(2026, 3, 31)
+    r = rule("MONTH", "04/11/2025", freq=6)
+    assert r.occurrence_on_or_after(date(2026, 1, 1)) == date(2026, 5, 4)
+    assert r.occurrence_on_or_after(date(2026, 5, 5)) == date(2026, 11, 4)
+
+def test_month_day_without_base_only_monthly():
+    assert rule("MONTH", "15", freq=2).occurrence_on_or_after(date(2026, 1, 1)) is None
+
+def test_year_leap_day():
+    r = rule("YEAR", "29/02/2024")
+    assert r.occurrence_on_or_after(date(2025, 1, 1)) == date(2028, 2, 29)
+
+def test_next_wakeup_and_due(index):
+    now = datetime(2026, 10, 19, 8, 0, tzinfo=TZ)             # lunes
+    rows = [
+        {"ACTIVIDAD": "Diaria", "FRECUENCIA": "1", "UNIDAD": "DAY", "FECHA": "", "HORA": "0900"},
+        {"ACTIVIDAD": "Semanal", "FRECUENCIA": "1", "UNIDAD": "WEEK", "FECHA": "3", "HORA": "1500"},
+    ]
+    pv._compile(rows, now)
+    half = timedelta(minutes=pv.WINDOW_MIN / 2)
+    assert pv.next_wakeup() == datetime(2026, 10, 19, 9, 0, tzinfo=TZ) - half
+    assert pv._due_now(now) == []
+
+    due = pv._due_now(datetime(2026, 10, 19, 8, 55, tzinfo=TZ))
+    assert [(pv._rules[i].actividad, occ) for i, occ in due] == [("Diaria", date(2026, 10, 19))]
+    # la diaria se reprograma para mañana, antes que la semanal del miércoles
+    assert pv.next_wakeup() == datetime(2026, 10, 20, 9, 0, tzinfo=TZ) - half
+
+def test_month_base_catch_up_is_due(index):
+    now = datetime(2026, 10, 19, 8, 0, tzinfo=TZ)
+    rows = [{"ACTIVIDAD": "Mensual", "FRECUENCIA": "1", "UNIDAD": "MONTH", "FECHA": "15/09/2026", "HORA": "0900"}]
+    pv._compile(rows, now)
+    # la del 15/oct sigue en catch-up hasta la del 15/nov
+    assert pv.next_wakeup() == datetime(2026, 10, 15, 9, 0, tzinfo=TZ)
+    assert pv._due_now(now) == [(0, date(2026, 10, 15))]
+    assert pv.next_wakeup() == datetime(2026, 11, 15, 9, 0, tzinfo=TZ)
+
+def test_compile_is_skipped_for_the_same_rows(index):
+    now = datetime(2026, 10, 19, 8, 0, tzinfo=TZ)
+    rows = [{"ACTIVIDAD": "Diaria", "FRECUENCIA": "1", "UNIDAD": "DAY", "FECHA": "", "HORA": "0900"}]
+    pv._compile(rows, now)
+    compiled = pv._rules
+    pv._compile(list(rows), now)            # mismo contenido, otra lista
+    assert pv._rules is compiled
@@ -0,0 +1,83 @@
+# File: tests/test_stocks_ema.py
+"""EMA200 de investment.stocks: paso recursivo y actualización incremental sobre CloseArrays."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from investment import price_cache, stocks
+
+TODAY = "2026-10-19"   # lunes; la barra de hoy es incompleta y no se guarda en el estado
+
+@pytest.fixture(autouse=True)
+def market_today(monkeypatch):
+    monkeypatch.setattr(stocks, "_market_today", lambda: TODAY)
+
+def arrays(closes: dict, days: pd.DatetimeIndex) -> price_cache.CloseArrays:
+    values = np.array([closes[s] for s in closes], dtype=np.float64)
+    return price_cache.CloseArrays(list(closes), days.values.astype("datetime64[D]").astype(np.int64), values)
+
+def series(n: int, end: str = TODAY) -> pd.DatetimeIndex:
+    return pd.bdate_range(end=end, periods=n)
+
+def test_ema_step_known_values():
+    # alpha = 2 / (200 + 1)
+    assert stocks._ema_step(100.0, 100.0) == 100.0
+    assert stocks._ema_step(100.0, 110.0) == pytest.approx(100.09950248756219, abs=1e-12)
+    assert stocks._ema_step(100.0, 99.0) == pytest.approx(99.99004975124378, abs=1e-12)
+
+def test_ema_step_matches_pandas_ewm():
+    closes = 100 + np.sin(np.arange(300) / 7.0) * 10
+    ema = closes[0]
+    for c in closes[1:]:
+        ema = stocks._ema_step(ema, c)
+    expected = pd.Series(closes).ewm(span=stocks.EMA_SPAN, adjust=False).mean().iloc[-1]
+    assert ema == pytest.approx(expected, rel=1e-12)
+
+def test_rebuild_stores_last_complete_bar():
+    days = series(5)
+    ca = arrays({"AAA": [10.0, 11.0, 12.0, 13.0, 14.0]}, days)
+    state = {}
+    out, redo = stocks._last_price_and_ema200(ca, state, rebuild=True)
+    assert redo == []
+    full = pd.Series([10.0, 11.0, 12.0, 13.0, 14.0]).ewm(span=stocks.EMA_SPAN, adjust=False).mean()
+    assert out["AAA"] == (14.0, pytest.approx(full.iloc[-1], rel=1e-12))
+    # la barra de hoy (TODAY) cuenta para el precio pero no se guarda
+    assert state["AAA"] == {"date": "2026-10-16", "close": 13.0, "ema": pytest.approx(full.iloc[-2], rel=1e-12)}
+
+def test_incremental_equals_rebuild():
+    days = series(260)
+    closes = list(100 + np.cumsum(np.sin(np.arange(260) / 5.0)))
+    full_state = {}
+    full, _ = stocks._last_price_and_ema200(arrays({"AAA": closes}, days), full_state, rebuild=True)
+
+    # estado al cierre de la barra 199; después solo llegan las barras desde esa fecha
+    state = {}
+    stocks._last_price_and_ema200(arrays({"AAA": closes[:200]}, days[:200]), state, rebuild=True)
+    assert state["AAA"]["date"] == days[199].strftime("%Y-%m-%d")
+    out, redo = stocks._last_price_and_ema200(arrays({"AAA": closes[199:]}, days[199:]), state)
+    assert redo == []
+    assert out["AAA"][1] == pytest.approx(full["AAA"][1], rel=1e-12)
+    assert state["AAA"] == {k: pytest.approx(v, rel=1e-12) if k != "date" else v
+                            for k, v in full_state["AAA"].items()}
+
+def test_incremental_redo_on_gap_or_split():
+    days = series(4)
+    state = {
+        "GAP": {"date": "2026-10-01", "close": 10.0, "ema": 10.0},      # la barra guardada no llegó
+        "SPLIT": {"date": days[0].strftime("%Y-%m-%d"), "close": 40.0, "ema": 40.0},
+        "OK": {"date": days[0].strftime("%Y-%m-%d"), "close": 10.0, "ema": 10.0},
+    }
+    ca = arrays({"GAP": [10.0] * 4, "SPLIT": [10.0] * 4, "OK": [10.0, 12.0, 12.0, 12.0]}, days)
+    out, redo = stocks._last_price_and_ema200(ca, state)
+    assert sorted(redo) == ["GAP", "SPLIT"]
+    assert set(out) == {"OK"}
+    ema = stocks._ema_step(stocks._ema_step(stocks._ema_step(10.0, 12.0), 12.0), 12.0)
+    assert out["OK"] == (12.0, pytest.approx(ema, rel=1e-12))
+
+def test_nan_bars_are_skipped_per_symbol():
+    days = series(4)
+    ca = arrays({"IPO": [np.nan, np.nan, 20.0, 21.0], "NONE": [np.nan] * 4}, days)
+    state = {}
+    out, _ = stocks._last_price_and_ema200(ca, state, rebuild=True)
+    assert "NONE" not in out
+    assert out["IPO"] == (21.0, pytest.approx(stocks._ema_step(20.0, 21.0), rel=1e-12))
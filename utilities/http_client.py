@@ -0,0 +1,160 @@
+# File: utilities/http_client.py
+"""
+Cliente HTTP compartido por los scripts.
+
+- Una requests.Session keep-alive por host (pool de conexiones, menos handshakes TLS).
+- Timeouts consistentes (conexión, lectura) por defecto.
+- Reintentos con backoff exponencial + jitter (tenacity) ante errores transitorios:
+  errores de red, timeouts y respuestas 5xx.
+- Circuit breaker por host: tras CB_FAILURES fallas seguidas el host se da por caído durante
+  CB_OPEN_S segundos y las llamadas fallan de inmediato (CircuitOpenError) sin gastar tiempo
+  del scheduler; después se deja pasar una llamada de prueba.
+"""
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential, wait_random
+
+from utilities import metrics
+
+# === Configuración ===
+DEFAULT_TIMEOUT = (3.05, 10)     # (conexión, lectura) en segundos
+DEFAULT_RETRIES = 3              # intentos totales por llamada
+BACKOFF_INITIAL_S = 0.5          # primera espera entre intentos (se duplica, con jitter)
+BACKOFF_MAX_S = 8.0
+BACKOFF_JITTER_S = 1.0           # se suma al azar (0..N s) a cada espera
+RETRY_STATUSES = {500, 502, 503, 504}
+POOL_SIZE = 4                    # conexiones keep-alive por host
+
+CB_FAILURES = 5                  # fallas seguidas para abrir el circuito
+CB_OPEN_S = 60                   # segundos que el circuito queda abierto
+
+class CircuitOpenError(requests.ConnectionError):
+    """El host acumuló fallas recientes; la llamada no se intentó. open_until: time.monotonic() de reapertura."""
+
+    def __init__(self, message: str, open_until: float):
+        super().__init__(message)
+        self.open_until = open_until
+
+class _RetryableStatus(Exception):
+    def __init__(self, response: requests.Response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+class _Breaker:
+    """Circuit breaker de un host (cerrado -> abierto -> medio abierto)."""
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def allow(self, now: float) -> bool:
+        if self.failures < CB_FAILURES:
+            return True
+        if now < self.open_until or self.probing:
+            return False
+        self.probing = True       # medio abierto: una sola llamada de prueba
+        return True
+
+    def record(self, ok: bool, now: float) -> None:
+        self.probing = False
+        if ok:
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures >= CB_FAILURES:
+            self.open_until = now + CB_OPEN_S
+
+# exponencial + jitter con piezas que tenacity acepta en todas sus versiones (>=8.2): el
+# `initial` de wait_exponential_jitter está obsoleto en 9.x y emite DeprecationWarning
+_WAIT = wait_exponential(multiplier=BACKOFF_INITIAL_S, max=BACKOFF_MAX_S) + wait_random(0, BACKOFF_JITTER_S)
+
+_lock = threading.Lock()
+_sessions: Dict[str, requests.Session] = {}
+_breakers: Dict[str, _Breaker] = {}
+
+def _host(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def _session_for(host: str) -> requests.Session:
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+        return session
+
+def _breaker_for(host: str) -> _Breaker:
+    with _lock:
+        return _breakers.setdefault(host, _Breaker())
+
+def _transient(exc: BaseException) -> bool:
+    if isinstance(exc, CircuitOpenError):
+        return False
+    return isinstance(exc, (_RetryableStatus, requests.ConnectionError, requests.Timeout))
+
+def open_until(url: str) -> float:
+    """time.monotonic() hasta el que el circuito del host de `url` rechaza llamadas (0 si está cerrado)."""
+    b = _breaker_for(_host(url))
+    with _lock:
+        return b.open_until if b.failures >= CB_FAILURES else 0.0
+
+def request(method: str, url: str, *, timeout=None, retries: int = DEFAULT_RETRIES, **kwargs) -> requests.Response:
+    """
+    Como requests.request, con sesión compartida, timeout por defecto, reintentos y breaker.
+    Una respuesta 5xx que persiste tras los reintentos se devuelve tal cual (el llamador
+    decide con raise_for_status); los errores de red se propagan.
+    """
+    host = _host(url)
+    session = _session_for(host)
+    breaker = _breaker_for(host)
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+
+    def attempt() -> requests.Response:
+        with _lock:
+            allowed = breaker.allow(time.monotonic())
+            open_until = breaker.open_until
+        if not allowed:
+            metrics.incr("http_circuit_open_total", host=host)
+            raise CircuitOpenError(f"Circuito abierto para {host}", open_until)
+        try:
+            with metrics.timer("http_request_seconds", io=True, host=host, method=method):
+                response = session.request(method, url, timeout=timeout, **kwargs)
+        except Exception as e:
+            metrics.incr("http_requests_total", host=host, method=method, status=type(e).__name__)
+            with _lock:
+                breaker.record(False, time.monotonic())
+            raise
+        metrics.incr("http_requests_total", host=host, method=method, status=response.status_code)
+        ok = response.status_code not in RETRY_STATUSES
+        with _lock:
+            breaker.record(ok, time.monotonic())
+        if not ok:
+            raise _RetryableStatus(response)
+        return response
+
+    retrying = Retrying(
+        stop=stop_after_attempt(max(1, retries)),
+        wait=_WAIT,
+        retry=retry_if_exception(_transient),
+        reraise=True,
+    )
+    try:
+        return retrying(attempt)
+    except _RetryableStatus as e:
+        return e.response
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
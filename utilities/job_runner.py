@@ -0,0 +1,92 @@
+# File: utilities/job_runner.py
+"""
+Ejecución de un script del scheduler (main.py) dentro de un hilo del pool o de un proceso
+del pool de procesos. Vive en su propio módulo para que los procesos hijos solo importen
+esto y sus scripts, no el scheduler completo.
+"""
+import importlib
+import os
+import signal
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from utilities import metrics, profiler
+
+def init_worker(preload: Iterable[str] = (), pid=None) -> None:
+    """
+    Inicializador de cada proceso: ignora Ctrl-C (lo maneja el padre) y deja los scripts importados.
+    pid: multiprocessing.Value donde se anota el pid del proceso (el scheduler lo usa para matarlo).
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if pid is not None:
+        pid.value = os.getpid()
+    timings = []
+    for name in preload:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"⚠️  Precarga de {name} en el proceso falló: {e}")
+            continue
+        timings.append(f"{name} {time.perf_counter() - t0:.2f}s")
+    if timings:
+        print(f"⏱️  Precarga en proceso de trabajo: {', '.join(timings)}", flush=True)
+
+def run(name: str, process: bool = False, profile: Optional[dict] = None
+        ) -> Tuple[Any, float, Optional[datetime], Optional[float], Optional[dict]]:
+    """
+    Corre module.main() y devuelve (resultado, segundos de red, next_wakeup() si el módulo lo tiene,
+    pico de memoria residente en MiB, lo que el scheduler debe absorber con absorb()).
+    process=True: la corrida ocupa sola un proceso del pool de procesos. Solo entonces se mide
+    el pico de memoria (es de todo el proceso: en hilos mezclaría scripts y al scheduler; si no,
+    None); las métricas registradas en el proceso y los resúmenes de Discord sin enviar se
+    devuelven al scheduler, y la cola del proceso se vacía antes de regresar (el hilo de envío
+    de un hijo no debe quedarse con mensajes pendientes).
+    profile: lo que regresó profiler.plan() en el scheduler; None = sin perfilar.
+    """
+    module = importlib.import_module(name)
+    metrics.io_reset()
+    if process:
+        metrics.rss_peak_reset()
+    try:
+        if profile is None:
+            result = module.main()
+        else:
+            with profiler.capture(name, profile):
+                result = module.main()
+    except BaseException:
+        if process:
+            _finish_process(ok=False)
+        raise
+    carry = _finish_process(ok=True) if process else None
+    wake = getattr(module, "next_wakeup", None)
+    peak_mb = metrics.rss_peak_mb() if process else None
+    return result, metrics.io_seconds(), (wake() if wake else None), peak_mb, carry
+
+def _finish_process(ok: bool) -> Optional[dict]:
+    """
+    Fin de una corrida en un proceso hijo: vacía la cola de Discord del proceso y regresa lo que
+    el scheduler debe absorber. Si la corrida falló no hay resultado que lo lleve: el resumen
+    acumulado se envía desde aquí y las métricas esperan a la siguiente corrida del proceso.
+    """
+    from utilities import sender
+    digest = sender.take_digest() if ok else {}
+    sender.flush()
+    if not ok:
+        return None
+    carry = {"metrics": metrics.drain()}   # después de flush: incluye los envíos a Discord
+    if digest:
+        carry["digest"] = digest
+    return carry
+
+def absorb(carry: Dict[str, Any]) -> None:
+    """En el scheduler: recibe lo que devolvió run() en un proceso hijo (métricas y resúmenes de Discord)."""
+    if carry.get("metrics"):
+        metrics.merge(carry["metrics"])
+    digest = carry.get("digest")
+    if digest:
+        from utilities import sender
+        for url, messages in digest.items():
+            for content in messages:
+                sender.send_discord_message(url, content)
@@ -0,0 +1,123 @@
+# File: utilities/market_calendar.py
+"""
+Calendario de NYSE calculado localmente (sin red): feriados, cierres anticipados y horario
+regular de 09:30 a 16:00 hora de Nueva York.
+"""
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Optional, Tuple
+
+try:
+    from zoneinfo import ZoneInfo  # Py 3.9+
+except Exception:
+    ZoneInfo = None
+
+MARKET_TZ = "America/New_York"
+OPEN_TIME = time(9, 30)
+CLOSE_TIME = time(16, 0)
+EARLY_CLOSE_TIME = time(13, 0)
+
+def _tz():
+    return ZoneInfo(MARKET_TZ) if ZoneInfo else None
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-ésimo día `weekday` (0=Lun) del mes; n=-1 es el último."""
+    if n > 0:
+        d = date(year, month, 1)
+        d += timedelta(days=(weekday - d.weekday()) % 7)
+        return d + timedelta(weeks=n - 1)
+    d = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return d - timedelta(days=(d.weekday() - weekday) % 7)
+
+def _easter(year: int) -> date:
+    """Domingo de Pascua (algoritmo gregoriano anónimo)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _observed(d: date) -> date:
+    """Sábado -> viernes anterior, domingo -> lunes siguiente."""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+@lru_cache(maxsize=16)
+def holidays(year: int) -> frozenset:
+    days = {
+        _nth_weekday(year, 1, 0, 3),            # Martin Luther King Jr.
+        _nth_weekday(year, 2, 0, 3),            # Presidents' Day
+        _easter(year) - timedelta(days=2),      # Good Friday
+        _nth_weekday(year, 5, 0, -1),           # Memorial Day
+        _observed(date(year, 7, 4)),            # Independence Day
+        _nth_weekday(year, 9, 0, 1),            # Labor Day
+        _nth_weekday(year, 11, 3, 4),           # Thanksgiving
+        _observed(date(year, 12, 25)),          # Christmas
+    }
+    # Año Nuevo: si cae en sábado NYSE no lo recorre al viernes 31/dic
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(days)
+
+def _early_close(d: date) -> bool:
+    if d == _nth_weekday(d.year, 11, 3, 4) + timedelta(days=1):   # viernes después de Thanksgiving
+        return True
+    if (d.month, d.day) == (12, 24):
+        return True
+    if (d.month, d.day) == (7, 3) and date(d.year, 7, 4).weekday() < 5:
+        return True
+    return False
+
+def is_trading_day(d: date) -> bool:
+    return d.weekday() < 5 and d not in holidays(d.year)
+
+def session(d: date) -> Optional[Tuple[datetime, datetime]]:
+    """(apertura, cierre) del día en hora de NY, o None si no hay mercado."""
+    if not is_trading_day(d):
+        return None
+    tz = _tz()
+    close = EARLY_CLOSE_TIME if _early_close(d) else CLOSE_TIME
+    return datetime.combine(d, OPEN_TIME, tzinfo=tz), datetime.combine(d, close, tzinfo=tz)
+
+def to_market(now: datetime) -> datetime:
+    """Hora de NY; las fechas sin tz se toman como hora local del sistema."""
+    if now.tzinfo is None:
+        now = now.astimezone()
+    return now.astimezone(_tz()) if _tz() else now
+
+def is_open(now: datetime) -> bool:
+    s = session(to_market(now).date())
+    return bool(s) and s[0] <= to_market(now) < s[1]
+
+def next_open(now: datetime) -> datetime:
+    """Próxima apertura estrictamente posterior a `now` (hora de NY)."""
+    now = to_market(now)
+    d = now.date()
+    while True:
+        s = session(d)
+        if s and s[0] > now:
+            return s[0]
+        d += timedelta(days=1)
+
+def last_close(now: datetime) -> Optional[datetime]:
+    """Cierre más reciente en o antes de `now` (hora de NY); None si no hay en los últimos 10 días."""
+    now = to_market(now)
+    d = now.date()
+    for _ in range(10):
+        s = session(d)
+        if s and s[1] <= now:
+            return s[1]
+        d -= timedelta(days=1)
+    return None
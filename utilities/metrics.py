@@ -0,0 +1,254 @@
+# File: utilities/metrics.py
+"""
+Métricas en memoria del scheduler y de las llamadas de red, con endpoint HTTP local.
+
+- Histogramas (observe/timer): acumulados desde el arranque (formato Prometheus) y, además,
+  una ventana móvil de WINDOW_S segundos con percentiles p50/p90/p99.
+- Contadores (incr).
+- Tiempo de red por hilo: los timers con io=True suman al hilo actual, para que el
+  scheduler sepa cuánto de cada corrida fue red (ver io_reset / io_seconds).
+- Pico de memoria residente (rss_peak_reset / rss_peak_mb), de todo el proceso: solo sirve
+  por corrida cuando el script tiene el proceso para él solo (modo "process" del scheduler).
+- Los procesos del pool de procesos llevan su propio registro: drain() lo saca y merge() lo suma
+  al del scheduler (ver utilities.job_runner).
+- serve() expone http://127.0.0.1:METRICS_PORT/metrics (texto Prometheus) y /metrics.json.
+"""
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Optional, Tuple
+
+# ============== CONFIG ==============
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+WINDOW_S = 3600                  # ventana de los percentiles móviles
+MAX_SAMPLES = 2048               # muestras máximas por serie en la ventana
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+QUANTILES = (0.5, 0.9, 0.99)
+# ===================================
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.window: Deque[Tuple[float, float]] = deque(maxlen=MAX_SAMPLES)
+
+    def observe(self, value: float, now: float) -> None:
+        i = bisect_left(BUCKETS, value)
+        if i < len(BUCKETS):
+            self.buckets[i] += 1
+        self.count += 1
+        self.sum += value
+        self.window.append((now, value))
+
+    def recent(self, now: float) -> list:
+        while self.window and self.window[0][0] < now - WINDOW_S:
+            self.window.popleft()
+        return sorted(v for _, v in self.window)
+
+_lock = threading.Lock()
+_histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+_counters: Dict[str, Dict[Labels, float]] = {}
+_io = threading.local()
+_server: Optional[ThreadingHTTPServer] = None
+
+def _key(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name: str, value: float, **labels) -> None:
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        h = series.get(_key(labels))
+        if h is None:
+            h = series[_key(labels)] = _Histogram()
+        h.observe(float(value), time.time())
+
+def incr(name: str, n: float = 1, **labels) -> None:
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[_key(labels)] = series.get(_key(labels), 0) + n
+
+@contextmanager
+def timer(name: str, io: bool = False, **labels):
+    """
+    with metrics.timer("http_request_seconds", io=True, host=h): ...
+    Registra la duración (también si hubo excepción); io=True la suma al tiempo de red del hilo.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(name, elapsed, **labels)
+        if io:
+            _io.seconds = getattr(_io, "seconds", 0.0) + elapsed
+
+def drain() -> dict:
+    """Saca lo registrado en este proceso y lo reinicia (serializable con pickle, para merge())."""
+    with _lock:
+        out = {
+            "histograms": {name: {labels: (h.buckets, h.count, h.sum, list(h.window))
+                                  for labels, h in series.items()}
+                           for name, series in _histograms.items()},
+            "counters": {name: dict(series) for name, series in _counters.items()},
+        }
+        _histograms.clear()
+        _counters.clear()
+    return out
+
+def merge(delta: dict) -> None:
+    """Suma al registro de este proceso lo que drain() sacó en otro."""
+    with _lock:
+        for name, series in delta.get("histograms", {}).items():
+            target = _histograms.setdefault(name, {})
+            for labels, (buckets, count, total, window) in series.items():
+                h = target.get(labels)
+                if h is None:
+                    h = target[labels] = _Histogram()
+                h.buckets = [a + b for a, b in zip(h.buckets, buckets)]
+                h.count += count
+                h.sum += total
+                # recent() descarta por la izquierda: la ventana debe quedar en orden de tiempo
+                h.window = deque(sorted([*h.window, *window]), maxlen=MAX_SAMPLES)
+        for name, series in delta.get("counters", {}).items():
+            target = _counters.setdefault(name, {})
+            for labels, v in series.items():
+                target[labels] = target.get(labels, 0) + v
+
+def io_reset() -> None:
+    """Reinicia el acumulador de tiempo de red del hilo actual."""
+    _io.seconds = 0.0
+
+def io_seconds() -> float:
+    """Tiempo de red acumulado por el hilo actual desde io_reset()."""
+    return getattr(_io, "seconds", 0.0)
+
+def rss_peak_reset() -> bool:
+    """
+    Reinicia el pico de memoria residente (VmHWM) del proceso; solo Linux (/proc/self/clear_refs).
+    Devuelve False si no se pudo: rss_peak_mb() será entonces el pico desde el arranque.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def rss_peak_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso en MiB desde rss_peak_reset() (o desde el arranque)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1048576 if sys.platform == "darwin" else peak / 1024   # macOS: bytes; Linux: KiB
+    except Exception:
+        return None
+
+def _quantile(values: list, q: float) -> Optional[float]:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def snapshot() -> dict:
+    """Estado actual serializable (lo que sirve /metrics.json)."""
+    now = time.time()
+    out: dict = {"generated_at": now, "window_s": WINDOW_S, "histograms": {}, "counters": {}}
+    with _lock:
+        for name, series in _histograms.items():
+            rows = []
+            for labels, h in series.items():
+                recent = h.recent(now)
+                rows.append({
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "window": {
+                        "count": len(recent),
+                        **{f"p{int(q * 100)}": _quantile(recent, q) for q in QUANTILES},
+                        "max": recent[-1] if recent else None,
+                    },
+                })
+            out["histograms"][name] = rows
+        for name, series in _counters.items():
+            out["counters"][name] = [{"labels": dict(k), "value": v} for k, v in series.items()]
+    return out
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(labels: Labels, extra: Labels = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def prometheus_text() -> str:
+    """Formato de exposición de Prometheus (text/plain; version=0.0.4)."""
+    now = time.time()
+    lines = []
+    with _lock:
+        for name, series in sorted(_histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, h in series.items():
+                acc = 0
+                for bound, n in zip(BUCKETS, h.buckets):
+                    acc += n
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', str(bound)),))} {acc}")
+                lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {h.count}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+            lines.append(f"# TYPE {name}_window gauge")
+            for labels, h in series.items():
+                recent = h.recent(now)
+                for q in QUANTILES:
+                    v = _quantile(recent, q)
+                    if v is not None:
+                        lines.append(f"{name}_window{_fmt_labels(labels, (('quantile', str(q)),))} {v:.6f}")
+        for name, series in sorted(_counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, v in series.items():
+                lines.append(f"{name}{_fmt_labels(labels)} {v}")
+    return "\n".join(lines) + "\n"
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            body, ctype = prometheus_text().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, ctype = json.dumps(snapshot(), ensure_ascii=False).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # sin log por petición
+
+def serve(host: str = METRICS_HOST, port: int = METRICS_PORT) -> ThreadingHTTPServer:
+    """Arranca (una vez) el endpoint en un hilo de fondo."""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
@@ -0,0 +1,207 @@
+# File: utilities/profiler.py
+"""
+Perfilado opcional (por muestreo) de las corridas del scheduler.
+
+Se activa por script en main.SCRIPTS con "profile": {"sample": 0.1, "slow_s": 20}
+o para todos con variables de entorno (tienen prioridad sobre la config):
+    SMARTHOME_PROFILE=all              # o lista: investment.stocks,maintenance.preventive
+    SMARTHOME_PROFILE_SAMPLE=0.1       # fracción de corridas que siempre se guardan
+    SMARTHOME_PROFILE_SLOW_S=20        # además, guardar toda corrida que tarde >= N s
+
+- sample: la corrida se perfila y se guarda con esa probabilidad.
+- slow_s: todas las corridas se perfilan, pero solo se guardan las lentas (no se sabe de
+  antemano cuál lo será).
+- tracemalloc (pico de memoria en el reporte): por defecto solo en las corridas elegidas por
+  `sample`; encarece las asignaciones, así que las que solo vigila `slow_s` no lo pagan.
+  "tracemalloc": True lo fuerza siempre, "tracemalloc": False lo apaga.
+- Sin "profile" ni SMARTHOME_PROFILE, plan() regresa None y la corrida no paga nada.
+
+Cada perfil guardado deja en PROFILE_DIR/<script>/:
+  <fecha>_<ms>ms_<pid>.txt     funciones con más tiempo acumulado (y propio) + pico de tracemalloc
+  <fecha>_<ms>ms_<pid>.folded  pilas colapsadas (flamegraph.pl, speedscope, inferno)
+Se conservan los últimos PROFILE_KEEP perfiles por script.
+
+Nota: tracemalloc es de todo el proceso; en modo "thread" el pico incluye a los scripts
+que corran a la vez en otros hilos. En modo "process" es el del proceso de trabajo.
+"""
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+# ============== CONFIG ==============
+PROFILE_DIR = Path(__file__).resolve().parent.parent / "data" / "profiles"
+PROFILE_KEEP = 20             # perfiles guardados por script
+PROFILE_INTERVAL_S = 0.005    # periodo de muestreo de la pila
+PROFILE_TOP = 40              # funciones en el reporte .txt
+ENV_SCRIPTS = "SMARTHOME_PROFILE"
+ENV_SAMPLE = "SMARTHOME_PROFILE_SAMPLE"
+ENV_SLOW_S = "SMARTHOME_PROFILE_SLOW_S"
+# ===================================
+
+_ROOT = str(Path(__file__).resolve().parent.parent) + os.sep
+_labels: Dict[object, str] = {}
+_tm_lock = threading.Lock()
+_tm_users = 0
+_tm_owned = False
+
+def _env() -> Optional[dict]:
+    scripts = os.environ.get(ENV_SCRIPTS, "").strip()
+    if not scripts or scripts.lower() in ("0", "no", "off"):
+        return None
+    conf = {"scripts": None if scripts.lower() in ("1", "all", "*") else {s.strip() for s in scripts.split(",")}}
+    try:
+        if os.environ.get(ENV_SAMPLE):
+            conf["sample"] = float(os.environ[ENV_SAMPLE])
+        if os.environ.get(ENV_SLOW_S):
+            conf["slow_s"] = float(os.environ[ENV_SLOW_S])
+    except ValueError as e:
+        print(f"⚠️  Configuración de perfilado inválida ({e}); se ignora")
+        return None
+    return conf
+
+_ENV = _env()   # se lee una vez al importar
+
+def plan(name: str, config: dict) -> Optional[dict]:
+    """
+    Decide si la corrida de `name` se perfila. None = no (el caso normal, sin costo);
+    si no, {"save": bool, "slow_s": float|None, "tracemalloc": bool} para job_runner.run.
+    """
+    conf = config.get("profile")
+    if _ENV is not None and (_ENV["scripts"] is None or name in _ENV["scripts"]):
+        conf = {**(conf or {}), **{k: v for k, v in _ENV.items() if k != "scripts"}}
+    if not conf:
+        return None
+    slow_s = conf.get("slow_s")
+    sample = conf.get("sample", 0.0 if slow_s else 1.0)
+    save = random.random() < sample
+    if not save and not slow_s:
+        return None
+    return {"save": save, "slow_s": slow_s, "tracemalloc": conf.get("tracemalloc", save)}
+
+class _Sampler(threading.Thread):
+    """Hilo que cada PROFILE_INTERVAL_S toma la pila del hilo perfilado (hasta el frame raíz)."""
+
+    def __init__(self, thread_id: int, root):
+        super().__init__(name="profiler", daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(PROFILE_INTERVAL_S):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                if frame is self.root:
+                    break
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._done.set()
+        self.join()
+        return self.stacks
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(_ROOT):
+            path = path[len(_ROOT):]
+        elif "site-packages" + os.sep in path:
+            path = path.split("site-packages" + os.sep, 1)[1]
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return label
+
+def _tracemalloc_start() -> None:
+    global _tm_users, _tm_owned
+    with _tm_lock:
+        if _tm_users == 0:
+            _tm_owned = not tracemalloc.is_tracing()   # si ya estaba activo (otro código), no se apaga al final
+            if _tm_owned:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+        _tm_users += 1
+
+def _tracemalloc_stop() -> int:
+    """Pico en bytes desde el arranque (o desde el último reset) y libera tracemalloc si nadie más lo usa."""
+    global _tm_users
+    with _tm_lock:
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+        _tm_users -= 1
+        if _tm_users == 0 and _tm_owned:
+            tracemalloc.stop()
+    return peak
+
+@contextmanager
+def capture(name: str, spec: dict):
+    """with profiler.capture(name, plan): module.main()  (en el hilo que corre el script)."""
+    sampler = _Sampler(threading.get_ident(), sys._getframe(2))   # frame de quien abrió el with
+    if spec.get("tracemalloc"):
+        _tracemalloc_start()
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        stacks = sampler.stop()
+        elapsed = time.perf_counter() - started
+        peak = _tracemalloc_stop() if spec.get("tracemalloc") else None
+        slow = spec.get("slow_s") is not None and elapsed >= spec["slow_s"]
+        if spec.get("save") or slow:
+            try:
+                path = _write(name, stacks, elapsed, peak, "lenta" if slow else "muestreo")
+                mem = f", pico {peak / 1048576:.1f} MiB" if peak is not None else ""
+                print(f"🔬 Perfil de {name} ({elapsed:.1f}s{mem}): {path}")
+            except Exception as e:
+                print(f"⚠️  No se pudo guardar el perfil de {name}: {e}")
+
+def _write(name: str, stacks: Counter, elapsed: float, peak: Optional[int], reason: str) -> Path:
+    folder = PROFILE_DIR / name
+    folder.mkdir(parents=True, exist_ok=True)
+    base = folder / f"{datetime.now():%Y%m%d-%H%M%S}_{elapsed * 1000:.0f}ms_{os.getpid()}"
+
+    total = sum(stacks.values())
+    cumulative, own = Counter(), Counter()
+    for stack, n in stacks.items():
+        for label in set(stack):
+            cumulative[label] += n
+        own[stack[-1]] += n
+
+    lines = [
+        f"script: {name}",
+        f"motivo: {reason}",
+        f"duración: {elapsed:.3f}s",
+        f"muestras: {total} (cada {PROFILE_INTERVAL_S * 1000:.0f} ms)",
+        f"pico tracemalloc: {peak / 1024:.0f} KiB" if peak is not None else "pico tracemalloc: (desactivado)",
+        "",
+        f"{'acum %':>7} {'propio %':>8}  función",
+    ]
+    for label, n in cumulative.most_common(PROFILE_TOP):
+        lines.append(f"{100 * n / total:7.1f} {100 * own[label] / total:8.1f}  {label}")
+    if not total:
+        lines.append("(sin muestras: la corrida duró menos que el periodo de muestreo)")
+    base.with_suffix(".txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    base.with_suffix(".folded").write_text(
+        "".join(f"{';'.join(stack)} {n}\n" for stack, n in stacks.most_common()), encoding="utf-8")
+
+    _rotate(folder)
+    return base.with_suffix(".txt")
+
+def _rotate(folder: Path) -> None:
+    reports = sorted(folder.glob("*.txt"))
+    for old in reports[:-PROFILE_KEEP]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".folded").unlink(missing_ok=True)
@@ -1,5 +1,11 @@
 # File: utilities/sender.py
-import requests
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from utilities import http_client, metrics
 
 # === Webhooks por categoría ===
 DISCORD_WEBHOOK_URL_INVESTING = "https://discord.com/api/webhooks/1428423347296796688/a6rfCu8z_tFrAYvpR-KfBfQ1BXbE7OEWIsYCNUSZNN4cGplTRE7XKvShwedk9ib3O-gJ"
@@ -8,16 +14,245 @@ DISCORD_WEBHOOK_URL_WEATHER = "https://discord.com/api/webhooks/1435323456223707
 DISCORD_WEBHOOK_URL_REMINDER = "https://discord.com/api/webhooks/1435347160471437544/WoOZhQtj1JkBk5KzjIBQpk16ZHv_ucFGGnwWd8mDQfdyVwN_Kgbxq6jSi4Yvys73uWd0"
 DISCORD_WEBHOOK_URL_DANGERSTACK = "https://discord.com/api/webhooks/1436135019793088602/m0mEP164svaye87He-XTJbFR1w4BNC3kaW6UgIzYoHCCsz4RE8Jud3DoOzFemfsiT4lI"
 
-def send_discord_message(webhook_url: str, content: str, send: bool = True):
-    data = {"content": content}
+# === Entrega ===
+SEND_TIMEOUT_S = 10        # timeout por POST
+MAX_ATTEMPTS = 5           # intentos por mensaje ante errores de red / 5xx
+RETRY_BACKOFF_S = 2.0      # espera base entre intentos (se duplica)
+QUEUE_MAX = 1000           # mensajes pendientes máximos (por webhook)
+FLUSH_TIMEOUT_S = 15       # espera máxima al vaciar la cola al apagar
+DISCORD_MAX_CHARS = 2000   # límite de Discord por mensaje
 
-    try:
-        response = requests.post(webhook_url, json=data)
-        """
-        if response.status_code not in (200, 204):
-            print(f"❌ Error al enviar mensaje ({response.status_code}): {response.text}")
+# === Modo resumen (digest), opcional por webhook ===
+# Los mensajes no urgentes se acumulan hasta `window_s` segundos o `max_count` mensajes
+# y se envían como un solo mensaje (partido en bloques de DISCORD_MAX_CHARS).
+# Apagado por defecto; se activa por webhook agregándolo aquí, p. ej.:
+#   DISCORD_WEBHOOK_URL_INVESTING: {"window_s": 30, "max_count": 15},
+# (enable_digest() solo afecta al proceso que lo llama; para los scripts en modo "process" usar esta tabla).
+# En modo "process" el proceso hijo no envía su resumen: lo devuelve al scheduler (take_digest),
+# que lo acumula en el suyo, así se combinan los mensajes de scripts en procesos distintos.
+DIGEST_SEPARATOR = "\n\n"
+DIGEST_WEBHOOKS: Dict[str, dict] = {}
+
+# Estado del drenador (protegido por _cond)
+_cond = threading.Condition()
+_pending: Dict[str, Deque[Tuple[dict, int]]] = {}   # webhook -> deque de (payload, intentos)
+_blocked_until: Dict[str, float] = {}               # webhook -> time.monotonic() hasta el que no se envía
+_digest: Dict[str, List[str]] = {}                  # webhook -> mensajes acumulados
+_digest_due: Dict[str, float] = {}                  # webhook -> time.monotonic() del envío del resumen
+_in_flight = 0
+_worker: Optional[threading.Thread] = None
+
+def _ensure_worker() -> None:
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_drain, name="discord-sender", daemon=True)
+        _worker.start()
+
+def enable_digest(webhook_url: str, window_s: float = 30, max_count: int = 15) -> None:
+    """Activa el modo resumen para un webhook."""
+    with _cond:
+        DIGEST_WEBHOOKS[webhook_url] = {"window_s": window_s, "max_count": max_count}
+
+def disable_digest(webhook_url: str) -> None:
+    """Desactiva el modo resumen (lo acumulado se envía de inmediato)."""
+    with _cond:
+        DIGEST_WEBHOOKS.pop(webhook_url, None)
+        _release_digest(webhook_url)
+        _cond.notify_all()
+
+def take_digest() -> Dict[str, List[str]]:
+    """Saca lo acumulado en los resúmenes sin enviarlo (webhook -> mensajes)."""
+    with _cond:
+        taken = dict(_digest)
+        _digest.clear()
+        _digest_due.clear()
+    return taken
+
+def _split_message(content: str) -> List[str]:
+    """Parte un mensaje en bloques de DISCORD_MAX_CHARS, prefiriendo cortar en saltos de línea."""
+    chunks = []
+    while len(content) > DISCORD_MAX_CHARS:
+        cut = content.rfind("\n", 0, DISCORD_MAX_CHARS)
+        if cut <= 0:
+            cut = DISCORD_MAX_CHARS
+        chunks.append(content[:cut])
+        content = content[cut:].lstrip("\n")
+    if content:
+        chunks.append(content)
+    return chunks
+
+def _combine(messages: List[str]) -> List[str]:
+    """Une mensajes en el menor número de bloques que quepan en DISCORD_MAX_CHARS."""
+    blocks: List[str] = []
+    current = ""
+    for msg in messages:
+        for piece in _split_message(msg):
+            if current and len(current) + len(DIGEST_SEPARATOR) + len(piece) <= DISCORD_MAX_CHARS:
+                current += DIGEST_SEPARATOR + piece
+            else:
+                if current:
+                    blocks.append(current)
+                current = piece
+    if current:
+        blocks.append(current)
+    return blocks
+
+def _enqueue(webhook_url: str, blocks: List[str]) -> None:
+    """Pasa bloques ya armados a la cola de envío. Llamar con _cond tomado."""
+    q = _pending.setdefault(webhook_url, deque())
+    for block in blocks:
+        if len(q) >= QUEUE_MAX:
+            print(f"❌ Cola de Discord llena ({QUEUE_MAX}), mensaje descartado")
+            return
+        q.append(({"content": block}, 0))
+
+def _release_digest(webhook_url: str) -> None:
+    """Envía lo acumulado en el resumen del webhook. Llamar con _cond tomado."""
+    messages = _digest.pop(webhook_url, [])
+    _digest_due.pop(webhook_url, None)
+    if messages:
+        _enqueue(webhook_url, _combine(messages))
+
+def send_discord_message(webhook_url: str, content: str, send: bool = True, urgent: bool = False):
+    """
+    Encola el mensaje y regresa de inmediato; un hilo de fondo lo entrega a Discord.
+    Si el webhook tiene modo resumen, el mensaje se acumula salvo que urgent=True.
+    """
+    if not send:
+        return
+    with _cond:
+        digest = DIGEST_WEBHOOKS.get(webhook_url)
+        if digest and not urgent:
+            buf = _digest.setdefault(webhook_url, [])
+            buf.append(content)
+            _digest_due.setdefault(webhook_url, time.monotonic() + digest["window_s"])
+            if len(buf) >= digest["max_count"]:
+                _release_digest(webhook_url)
         else:
-            print("✅ Mensaje enviado a Discord correctamente.")
-        """    
+            _enqueue(webhook_url, _split_message(content))
+        _ensure_worker()
+        _cond.notify_all()
+
+def _rate_limit_wait(response) -> float:
+    """Segundos a esperar según Retry-After / X-RateLimit-* (0 si se puede seguir enviando)."""
+    headers = response.headers
+    if response.status_code == 429:
+        retry_after = headers.get("Retry-After")
+        if retry_after is None:
+            try:
+                retry_after = response.json().get("retry_after")
+            except Exception:
+                retry_after = None
+        try:
+            return max(float(retry_after), 0.5)
+        except (TypeError, ValueError):
+            return 1.0
+    if headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            return float(headers.get("X-RateLimit-Reset-After", 0))
+        except ValueError:
+            return 0.0
+    return 0.0
+
+def _post(webhook_url: str, data: dict) -> Tuple[str, float]:
+    """
+    Envía un mensaje. Devuelve (estado, espera):
+      "ok"      -> entregado (espera = pausa pedida por el rate limit para el siguiente)
+      "limited" -> 429, reintentar tras Retry-After
+      "error"   -> 5xx o error de red, reintentar con backoff
+      "circuit" -> el circuit breaker de http_client está abierto (o esta falla lo abrió): esperar
+                   a que deje pasar la llamada de prueba, sin gastar intento
+      "drop"    -> error definitivo (4xx), se descarta
+    """
+    status, wait = _post_once(webhook_url, data)
+    if status == "error":
+        # host caído (caída de Discord): los mensajes esperan al circuito en vez de agotar intentos
+        until = http_client.open_until(webhook_url)
+        if until > time.monotonic():
+            status, wait = "circuit", until - time.monotonic()
+    metrics.incr("sender_posts_total", status=status)
+    return status, wait
+
+def _post_once(webhook_url: str, data: dict) -> Tuple[str, float]:
+    try:
+        # sin reintentos en línea: el drenador ya reintenta con backoff y respeta el rate limit
+        with metrics.timer("sender_post_seconds"):
+            response = http_client.post(webhook_url, json=data, timeout=SEND_TIMEOUT_S, retries=1)
+    except http_client.CircuitOpenError as e:
+        # al menos 1 s: si otra llamada está probando el host, open_until ya pasó
+        return "circuit", max(e.open_until - time.monotonic(), 1.0)
     except Exception as e:
         print(f"❌ Excepción al enviar mensaje: {e}")
+        return "error", 0.0
+
+    wait = _rate_limit_wait(response)
+    if response.status_code == 429:
+        return "limited", wait
+    if response.status_code >= 500:
+        return "error", wait
+    if response.status_code not in (200, 204):
+        print(f"❌ Error al enviar mensaje ({response.status_code}): {response.text}")
+        return "drop", wait
+    return "ok", wait
+
+def _next_ready(now: float) -> Tuple[Optional[str], Optional[float]]:
+    """Webhook listo para enviar, o el tiempo a esperar hasta el próximo. Llamar con _cond tomado."""
+    wake = None
+    for url, due in list(_digest_due.items()):
+        if due <= now:
+            _release_digest(url)
+        else:
+            wake = due - now if wake is None else min(wake, due - now)
+    for url, q in _pending.items():
+        if not q:
+            continue
+        until = _blocked_until.get(url, 0.0)
+        if until <= now:
+            return url, None
+        wake = until - now if wake is None else min(wake, until - now)
+    return None, wake
+
+def _drain() -> None:
+    """Hilo de fondo: entrega los mensajes respetando el rate limit de cada webhook."""
+    global _in_flight
+    while True:
+        with _cond:
+            url, wake = _next_ready(time.monotonic())
+            while url is None:
+                _cond.wait(timeout=wake)
+                url, wake = _next_ready(time.monotonic())
+            data, attempts = _pending[url].popleft()
+            _in_flight += 1
+
+        status, wait = _post(url, data)
+
+        with _cond:
+            _in_flight -= 1
+            if status == "error":
+                wait = max(wait, RETRY_BACKOFF_S * (2 ** attempts))
+            if status in ("limited", "error", "circuit"):
+                # 429 y circuito abierto no cuentan como intento: solo hay que esperar
+                attempts += status == "error"
+                if attempts < MAX_ATTEMPTS:
+                    _pending[url].appendleft((data, attempts))
+                else:
+                    print(f"❌ Mensaje descartado tras {MAX_ATTEMPTS} intentos")
+            if wait > 0:
+                _blocked_until[url] = time.monotonic() + wait
+            _cond.notify_all()
+
+def flush(timeout: float = FLUSH_TIMEOUT_S) -> bool:
+    """Envía los resúmenes acumulados y espera a que se entregue todo. Devuelve True si la cola quedó vacía."""
+    deadline = time.monotonic() + timeout
+    with _cond:
+        for url in list(_digest):
+            _release_digest(url)
+        _cond.notify_all()
+        while _in_flight or any(_pending.values()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or _worker is None or not _worker.is_alive():
+                return False
+            _cond.wait(timeout=remaining)
+    return True
+
+atexit.register(flush)
@@ -0,0 +1,128 @@
+# File: utilities/state_store.py
+"""
+Almacén de estado compartido (SQLite en modo WAL) para scheduler y scripts.
+
+- Llaves agrupadas por namespace ("stocks.cooldown", "reminders.sent", "scheduler", ...).
+- Valores serializados como JSON.
+- TTL opcional por llave: las vencidas no se leen y se borran al escribir en su namespace.
+- Cada put/put_many/batch es una sola transacción atómica: solo se escriben las llaves que cambian.
+"""
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DB_PATH = DATA_DIR / "state.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+    expires_at REAL, updated_at REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS kv_expires ON kv (ns, expires_at);
+"""
+
+_local = threading.local()   # una conexión por hilo
+
+def _conn() -> sqlite3.Connection:
+    con = getattr(_local, "con", None)
+    if con is None or getattr(_local, "path", None) != DB_PATH:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(DB_PATH, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.executescript(_SCHEMA)
+        _local.con, _local.path = con, DB_PATH
+    return con
+
+def get(ns: str, key: str, default: Any = None) -> Any:
+    row = _conn().execute(
+        "SELECT value FROM kv WHERE ns=? AND key=? AND (expires_at IS NULL OR expires_at>?)",
+        (ns, key, time.time()),
+    ).fetchone()
+    return json.loads(row[0]) if row else default
+
+def get_all(ns: str) -> Dict[str, Any]:
+    rows = _conn().execute(
+        "SELECT key, value FROM kv WHERE ns=? AND (expires_at IS NULL OR expires_at>?)",
+        (ns, time.time()),
+    )
+    return {k: json.loads(v) for k, v in rows}
+
+class Batch:
+    """Cambios acumulados que se aplican juntos en una transacción (ver batch())."""
+
+    def __init__(self, ns: str):
+        self.ns = ns
+        self.puts: Dict[str, tuple] = {}
+        self.deletes: set = set()
+
+    def put(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        self.deletes.discard(key)
+        self.puts[key] = (value, ttl_s)
+
+    def delete(self, key: str) -> None:
+        self.puts.pop(key, None)
+        self.deletes.add(key)
+
+def _apply(b: Batch) -> None:
+    if not b.puts and not b.deletes:
+        return
+    now = time.time()
+    con = _conn()
+    with con:
+        con.execute("DELETE FROM kv WHERE ns=? AND expires_at IS NOT NULL AND expires_at<=?", (b.ns, now))
+        con.executemany(
+            "INSERT OR REPLACE INTO kv VALUES (?,?,?,?,?)",
+            [
+                (b.ns, k, json.dumps(v, ensure_ascii=False), (now + ttl) if ttl else None, now)
+                for k, (v, ttl) in b.puts.items()
+            ],
+        )
+        con.executemany("DELETE FROM kv WHERE ns=? AND key=?", [(b.ns, k) for k in b.deletes])
+
+@contextmanager
+def batch(ns: str):
+    """
+    with state_store.batch("ns") as b:
+        b.put("k", v); b.delete("otra")
+    Todo se escribe al salir del bloque, o nada si hubo excepción.
+    """
+    b = Batch(ns)
+    yield b
+    _apply(b)
+
+def put(ns: str, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+    with batch(ns) as b:
+        b.put(key, value, ttl_s)
+
+def put_many(ns: str, items: Dict[str, Any], ttl_s: Optional[float] = None) -> None:
+    with batch(ns) as b:
+        for k, v in items.items():
+            b.put(k, v, ttl_s)
+
+def delete(ns: str, keys: Iterable[str]) -> None:
+    with batch(ns) as b:
+        for k in keys:
+            b.delete(k)
+
+def migrate_json(ns: str, path: Path, ttl_s: Optional[float] = None) -> None:
+    """Importa una sola vez un archivo de estado JSON heredado (dict) y lo renombra a *.migrated."""
+    if not path.exists():
+        return
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        data = {}
+    if isinstance(data, dict) and data:
+        current = get_all(ns)
+        put_many(ns, {k: v for k, v in data.items() if k not in current}, ttl_s)
+    try:
+        path.rename(path.with_name(path.name + ".migrated"))
+    except OSError:
+        pass